@@ -0,0 +1,144 @@
+import numpy as np
+
+# Hash table from integer keys to small integer values, read and written many keys at a time
+# (VecEnv keeps the dot in each grid cell of every field in one). Open addressing with linear
+# probing over a single int64 array: an entry is key << valueBits | value, with EMPTY and
+# REMOVED marking free slots. The first pass only looks at each key's own slot (that settles most
+# of them), later passes at the next WINDOW slots at once, so the rest are settled in about one more pass
+# and small batches don't pay for a numpy call per probe (the smallest are done in plain Python,
+# with the same hash, as numpy's per call overhead is bigger than the work). Memory only grows
+# with the number of entries, not with the range of the keys, and the table is rebuilt bigger
+# (dropping removed entries) before it gets too full
+
+EMPTY = -1
+REMOVED = -2
+HASH = np.uint64(0x9E3779B97F4A7C15)		# Fibonacci hashing multiplier
+WORD = (1 << 64) - 1
+SMALL_BATCH = 32			# fewer keys than this are done without numpy
+MIN_SLOTS = 1024
+WINDOW = 8					# slots looked at per key and pass (8 entries are one cache line)
+STEPS = np.arange(WINDOW)
+
+class CellTable():
+
+	def __init__(self, valueBits, size=0):
+	# valueBits bits hold a value (values are < 2 ** valueBits), size is how many entries to expect
+
+		self.valueBits = valueBits
+		self.valueMask = (1 << valueBits) - 1
+		self.count = 0			# entries in the table
+		self.used = 0			# slots that aren't EMPTY (entries and REMOVED ones)
+		self.allocate(size)
+
+	def allocate(self, size):
+	# Empty table with room for size entries at a third of the slots (probe runs stay short)
+
+		slots = MIN_SLOTS
+		while slots < 3 * size:
+			slots *= 2
+		self.bits = slots.bit_length() - 1
+		self.mask = slots - 1
+		self.table = np.full(slots, EMPTY, dtype=np.int64)
+		self.used = 0
+
+	def slots(self, keys):
+		return ((keys.view(np.uint64) * HASH) >> np.uint64(64 - self.bits)).view(np.int64)
+
+	def find(self, keys):
+	# Slot of every key, -1 for keys that aren't in the table (EMPTY and REMOVED shifted down
+	# are -1, so comparing the key part of a slot is enough)
+
+		keys = np.asarray(keys, dtype=np.int64)
+		if len(keys) < SMALL_BATCH:
+			return np.array([self.findOne(key) for key in keys.tolist()], dtype=np.int64)
+		pos = self.slots(keys)
+		entries = self.table[pos]
+		hit = (entries >> self.valueBits) == keys
+		found = np.where(hit, pos, -1)
+		idx = np.flatnonzero(~hit & (entries != EMPTY))		# an EMPTY slot ends the search
+		pos = pos[idx] + 1
+		while len(idx) > 0:
+			window = (pos[:, None] + STEPS) & self.mask
+			entries = self.table[window]
+			hit = (entries >> self.valueBits) == keys[idx, None]
+			hitAny = hit.any(axis=1)
+			found[idx[hitAny]] = window[hitAny, hit[hitAny].argmax(axis=1)]
+			more = ~hitAny & ~(entries == EMPTY).any(axis=1)
+			idx = idx[more]
+			pos = pos[more] + WINDOW
+		return found
+
+	def slot(self, key):
+		return ((key * int(HASH)) & WORD) >> (64 - self.bits)
+
+	def findOne(self, key):
+		table = self.table
+		pos = self.slot(key)
+		while True:
+			entry = table.item(pos)
+			if entry >> self.valueBits == key:
+				return pos
+			if entry == EMPTY:
+				return -1
+			pos = (pos + 1) & self.mask
+
+	def lookup(self, keys):
+	# Value of every key, -1 for keys that aren't in the table
+
+		pos = self.find(keys)
+		return np.where(pos >= 0, self.table[pos] & self.valueMask, -1)
+
+	def insert(self, keys, values):
+	# Add keys (none of them in the table yet, no repeats) with their values
+
+		keys = np.asarray(keys, dtype=np.int64)
+		if self.used + len(keys) > (self.mask + 1) // 2:
+			self.rebuild(self.count + len(keys))
+		entries = (keys << self.valueBits) | np.asarray(values, dtype=np.int64)
+		if len(keys) < SMALL_BATCH:
+			for key, entry in zip(keys.tolist(), entries.tolist()):
+				self.insertOne(key, entry)
+			return
+		idx = np.arange(len(keys))
+		pos = self.slots(keys)
+		steps = STEPS[:1]
+		while len(idx) > 0:
+			window = (pos[:, None] + steps) & self.mask
+			isFree = self.table[window] < 0
+			freeAny = isFree.any(axis=1)
+			free = np.flatnonzero(freeAny)
+			slot = window[free, isFree[free].argmax(axis=1)]		# first free slot in the window
+			wasEmpty = self.table[slot] == EMPTY
+			self.table[slot] = entries[idx[free]]		# keys racing for one slot: one of them gets it
+			won = self.table[slot] == entries[idx[free]]
+			self.used += int((wasEmpty & won).sum())
+			stored = np.zeros(len(idx), dtype=bool)
+			stored[free[won]] = True
+			idx = idx[~stored]
+			pos = np.where(freeAny, pos, pos + len(steps))[~stored]		# losers try the same window again
+			steps = STEPS
+		self.count += len(keys)
+
+	def insertOne(self, key, entry):
+		table = self.table
+		pos = self.slot(key)
+		while table.item(pos) >= 0:
+			pos = (pos + 1) & self.mask
+		if table.item(pos) == EMPTY:
+			self.used += 1
+		table[pos] = entry
+		self.count += 1
+
+	def remove(self, keys):
+	# Remove keys (all of them in the table)
+
+		self.table[self.find(keys)] = REMOVED
+		self.count -= len(keys)
+
+	def rebuild(self, size):
+	# Put the entries into a new table sized for size entries
+
+		entries = self.table[self.table >= 0]
+		self.allocate(size)
+		self.count = 0
+		self.insert(entries >> self.valueBits, entries & self.valueMask)
@@ -0,0 +1,102 @@
+import json
+import Agent
+import Schedule
+import World
+
+# Every tunable of the world, the agent's body and the learner in one place, with the values
+# the simulator always used as defaults. Loaded from a YAML (needs PyYAML) or JSON file and/or
+# set from the command line, and passed around as a plain dict (e.g. to worker processes)
+DEFAULTS = {
+	'fieldSize': 1.25,		# field is a square from (0, 0) to (fieldSize, fieldSize)
+	'numDots': 50,
+	'maxGreen': 30,			# at most this many dots start out green
+	'greenChance': 0.6,		# chance of a new dot being green (while under maxGreen)
+	'dotRadius': 0.015,
+	'agentRadius': 0.025,
+	'numEyes': 5,
+	'viewDist': 0.2,		# how far the eyes see
+	'epsilon': 0.1,			# exploration rate while training
+	'gamma': 0.7,			# discount of future rewards
+	'alphaSchedule': 'global',	# learning rate decay by 'global' age or per state/action 'visits'
+	'alphaScale': 1000.0,	# alpha = alphaScale / (alphaScale + age or visits)
+	'epsilonMin': 0.0,		# epsilon decays towards this...
+	'epsilonHalfLife': 0,	# ...halving the gap every this many iterations (0 = fixed epsilon)
+	'bonus': 0.0,			# exploration bonus / sqrt(1 + visits) for rarely tried actions
+}
+
+class Config():
+
+	def __init__(self, values=None):
+		for name, value in DEFAULTS.items():
+			setattr(self, name, value)
+		if values:
+			self.update(values)
+
+	def update(self, values):
+	# Set options from a dict, None values are skipped (e.g. command line options that weren't given)
+
+		for name, value in values.items():
+			if name not in DEFAULTS:
+				raise ValueError("Unknown config option '%s', options are: %s" % (name, ", ".join(sorted(DEFAULTS))))
+			if value is not None:
+				setattr(self, name, type(DEFAULTS[name])(value))
+		self.check()
+
+	def check(self):
+	# Raise ValueError for values the simulator can't run with
+
+		problems = []
+		for name in ('fieldSize', 'dotRadius', 'agentRadius', 'viewDist', 'alphaScale'):
+			if not getattr(self, name) > 0:
+				problems.append("%s must be positive" % name)
+		for name in ('numDots', 'maxGreen', 'epsilonHalfLife', 'bonus'):
+			if getattr(self, name) < 0:
+				problems.append("%s can't be negative" % name)
+		for name in ('greenChance', 'epsilon', 'epsilonMin', 'gamma'):
+			if not 0 <= getattr(self, name) <= 1:
+				problems.append("%s must be between 0 and 1" % name)
+		if self.numEyes < 2:
+			problems.append("numEyes must be at least 2 (the outer eyes are spread over 60 degrees)")
+		if self.fieldSize > 0 and 2 * self.dotRadius >= self.fieldSize:
+			problems.append("dotRadius %g is too big for a field of size %g" % (self.dotRadius, self.fieldSize))
+		if self.fieldSize > 0 and 2 * self.agentRadius >= self.fieldSize:
+			problems.append("agentRadius %g is too big for a field of size %g" % (self.agentRadius, self.fieldSize))
+		if self.alphaSchedule not in Schedule.ALPHAS:
+			problems.append("alphaSchedule must be one of: %s" % ", ".join(Schedule.ALPHAS))
+		if problems:
+			raise ValueError("Invalid config: " + "; ".join(problems))
+
+	def toDict(self):
+		return {name: getattr(self, name) for name in DEFAULTS}
+
+	def makeWorld(self, seed=None):
+		world = World.World(self.fieldSize, seed, self.dotRadius)
+		world.createWorld(self.numDots, self.maxGreen, self.greenChance)
+		return world
+
+	def makeBody(self):
+		return World.AgentState(self.fieldSize, self.numEyes, self.viewDist, self.agentRadius)
+
+	def makeVecEnv(self, numEnvs, seed=None):
+		import VecEnv
+		return VecEnv.VecEnv(numEnvs, seed, self.fieldSize, self.numDots, self.numEyes, self.viewDist, self.dotRadius, self.agentRadius, self.maxGreen, self.greenChance)
+
+	def makeAgent(self, backend='array', seed=None):
+		return Agent.Agent(self.numEyes, backend, seed, self.epsilon, self.gamma)
+
+	def makeSchedule(self):
+		return Schedule.Schedule(self.alphaSchedule, self.alphaScale, self.epsilon, self.epsilonMin, self.epsilonHalfLife, self.bonus)
+
+def load(filename):
+# Config from a .yaml/.yml or .json file holding a mapping of option names to values
+
+	with open(filename) as f:
+		if filename.endswith('.yaml') or filename.endswith('.yml'):
+			try:
+				import yaml
+			except ImportError:
+				raise ImportError("Reading %s needs PyYAML (pip install pyyaml), or use a .json config" % filename)
+			values = yaml.safe_load(f)
+		else:
+			values = json.load(f)
+	return Config(values or {})
@@ -0,0 +1,90 @@
+import array
+
+class FreeCells():
+# Where a new dot can go without checking any dots. The area dot centers may use
+# ([margin, size - margin] on both axes) is split into small square cells and every cell
+# counts the dots whose keep-out box (closer than minSep on both axes) overlaps it. Cells
+# with a count of 0 are kept at the front of a list (removed by swapping with the last
+# one), so picking a random free cell and a random point in it always gives a valid spot
+# in O(1). Plain int arrays keep the per-cell updates cheap and the memory small
+
+	def __init__(self, size, margin, minSep, cellSize):
+		self.margin = margin
+		self.minSep = minSep
+		span = size - 2 * margin
+		self.numCells = max(int(-(-span // cellSize)), 1)		# cells per side
+		self.cellSize = span / self.numCells
+		total = self.numCells * self.numCells
+		self.counts = array.array('i', bytes(4 * total))
+		self.free = array.array('i', range(total))		# free cells, the first numFree are valid
+		self.pos = array.array('i', range(total))		# where each cell is in free
+		self.numFree = total
+
+	def cells(self, x, y):
+	# Cells overlapped by the keep-out box around (x, y), erring on the side of too many
+
+		lo = self.margin
+		cs = self.cellSize
+		n = self.numCells
+		x0 = max(int((x - self.minSep - lo) // cs), 0)
+		x1 = min(int((x + self.minSep - lo) // cs) + 1, n)
+		y0 = max(int((y - self.minSep - lo) // cs), 0)
+		y1 = min(int((y + self.minSep - lo) // cs) + 1, n)
+		return [cx * n + cy for cx in range(x0, x1) for cy in range(y0, y1)]
+
+	def block(self, x, y):
+	# A dot was placed at (x, y)
+
+		counts = self.counts
+		for cell in self.cells(x, y):
+			if counts[cell] == 0:
+				self.take(cell)
+			counts[cell] += 1
+
+	def unblock(self, x, y):
+	# The dot at (x, y) was moved away
+
+		counts = self.counts
+		for cell in self.cells(x, y):
+			counts[cell] -= 1
+			if counts[cell] == 0:
+				self.give(cell)
+
+	def take(self, cell):
+	# Swap cell with the last free one and shrink the free part
+
+		free = self.free
+		pos = self.pos
+		last = self.numFree - 1
+		i = pos[cell]
+		other = free[last]
+		free[i] = other
+		pos[other] = i
+		free[last] = cell
+		pos[cell] = last
+		self.numFree = last
+
+	def give(self, cell):
+	# Swap cell with the first blocked one and grow the free part
+
+		free = self.free
+		pos = self.pos
+		first = self.numFree
+		i = pos[cell]
+		other = free[first]
+		free[i] = other
+		pos[other] = i
+		free[first] = cell
+		pos[cell] = first
+		self.numFree = first + 1
+
+	def sample(self, rng):
+	# Random point in a random free cell, None when every cell is (at least partly) blocked
+
+		if self.numFree == 0:
+			return None
+		cell = self.free[rng.randrange(self.numFree)]
+		cx, cy = divmod(cell, self.numCells)
+		x = self.margin + (cx + rng.random()) * self.cellSize
+		y = self.margin + (cy + rng.random()) * self.cellSize
+		return x, y
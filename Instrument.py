@@ -0,0 +1,110 @@
+import json
+import time
+
+PHASES = ['choose', 'move', 'absorb', 'relocate', 'sense', 'age', 'learn', 'render']
+BUCKETS = 40			# log2 histogram buckets in nanoseconds, the last one takes everything above ~9 minutes
+
+class NullInstrument():
+# Stand-in used when instrumentation is off, every call is an empty method
+
+	def begin(self):
+		pass
+
+	def mark(self, phase):
+		pass
+
+	def tick(self, age):
+		pass
+
+	def close(self):
+		pass
+
+class Instrument():
+# Wall time per phase of the train/play loop. The loop calls begin() at the start of an
+# iteration and mark(phase) at the end of each phase, every mark is charged the time
+# since the previous one. Every exportEvery iterations one row per phase (call count,
+# total/mean time, percentiles from a log2 histogram) is appended to filename as CSV or
+# JSON lines (by extension) and the histograms start over
+
+	def __init__(self, filename, exportEvery=1000):
+		self.filename = filename
+		self.exportEvery = exportEvery
+		self.jsonl = filename.endswith('.jsonl') or filename.endswith('.json')
+		self.file = open(filename, 'w')
+		if not self.jsonl:
+			self.file.write("age,phase,calls,total_s,mean_us,p50_us,p90_us,p99_us\n")
+		self.clock = time.perf_counter
+		self.last = self.clock()
+		self.reset()
+
+	def reset(self):
+		self.calls = {phase: 0 for phase in PHASES}
+		self.total = {phase: 0.0 for phase in PHASES}
+		self.hist = {phase: [0] * BUCKETS for phase in PHASES}
+
+	def begin(self):
+		self.last = self.clock()
+
+	def mark(self, phase):
+		now = self.clock()
+		elapsed = now - self.last
+		self.last = now
+		self.calls[phase] += 1
+		self.total[phase] += elapsed
+		self.hist[phase][min(int(elapsed * 1e9).bit_length(), BUCKETS - 1)] += 1
+
+	def tick(self, age):
+		if age % self.exportEvery == 0:
+			self.export(age)
+
+	def percentile(self, phase, fraction):
+	# Upper edge (in microseconds) of the histogram bucket the percentile falls in
+
+		target = fraction * self.calls[phase]
+		seen = 0
+		for bucket, count in enumerate(self.hist[phase]):
+			seen += count
+			if count > 0 and seen >= target:
+				return (1 << bucket) / 1000.0
+		return 0.0
+
+	def export(self, age):
+		for phase in PHASES:
+			calls = self.calls[phase]
+			if calls == 0:
+				continue
+			row = {
+				'age': age,
+				'phase': phase,
+				'calls': calls,
+				'total_s': self.total[phase],
+				'mean_us': self.total[phase] / calls * 1e6,
+				'p50_us': self.percentile(phase, 0.5),
+				'p90_us': self.percentile(phase, 0.9),
+				'p99_us': self.percentile(phase, 0.99),
+			}
+			if self.jsonl:
+				row['hist_log2_ns'] = self.hist[phase]
+				self.file.write(json.dumps(row) + "\n")
+			else:
+				self.file.write("%d,%s,%d,%.6f,%.3f,%.3f,%.3f,%.3f\n" % (age, phase, calls, row['total_s'], row['mean_us'], row['p50_us'], row['p90_us'], row['p99_us']))
+		self.file.flush()
+		self.reset()
+
+	def close(self):
+		self.file.close()
+
+def profile(fn, filename, *args):
+# Run fn(*args) under cProfile, save the stats to filename and print the top entries
+# (also when the run is interrupted). With no filename fn just runs normally
+
+	if not filename:
+		return fn(*args)
+	import cProfile
+	import pstats
+	profiler = cProfile.Profile()
+	try:
+		return profiler.runcall(fn, *args)
+	finally:
+		profiler.dump_stats(filename)
+		pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
@@ -0,0 +1,277 @@
+import numpy as np
+import math
+import random
+
+class QTable():
+# Q values stored in one contiguous (states x actions) array
+# A state (what every eye sees) is encoded as a base-numCodes integer with the first eye as the
+# most significant digit, so every possible state has a row and lookups are plain indexing
+
+	def __init__(self, numEyes=5, numActions=5, numCodes=4):
+		self.numEyes = numEyes
+		self.numActions = numActions
+		self.numCodes = numCodes
+		self.numStates = numCodes ** numEyes
+		self.q = np.zeros((self.numStates, numActions))
+		self.visits = np.zeros((self.numStates, numActions), dtype=np.uint32)	# number of updates per state/action
+
+	def encode(self, detected):
+	# State key for what every eye sees
+
+		s = 0
+		for code in detected:
+			s = s * self.numCodes + code
+		return s
+
+	def decode(self, s):
+		detected = [0] * self.numEyes
+		for i in range(self.numEyes - 1, -1, -1):
+			s, detected[i] = divmod(s, self.numCodes)
+		return tuple(detected)
+
+	def getQ(self, state, action):
+		return float(self.q[state, action])
+
+	def encodeAll(self, detected):
+	# encode for an array of states (one row of eye codes per state)
+
+		s = np.zeros(len(detected), dtype=np.int64)
+		for i in range(self.numEyes):
+			s = s * self.numCodes + detected[:, i]
+		return s
+
+	def learnQ(self, state, action, reward, value, alpha):
+	# Set reward for state/action or update existing reward
+	# alpha can also be a function of the entry's visit count (see Schedule)
+
+		visits = self.visits[state, action]
+		if visits == 0:
+			self.q[state, action] = reward
+		else:
+			if callable(alpha):
+				alpha = alpha(int(visits))
+			self.q[state, action] += alpha * (value - self.q[state, action])
+		self.visits[state, action] += 1
+
+	def learnBatch(self, states, actions, rewards, values, alpha):
+	# learnQ for arrays of updates at once. Updates that hit the same state/action are averaged
+	# into one update so the result doesn't depend on their order
+
+		flat = states * self.numActions + actions
+		keys, inverse, counts = np.unique(flat, return_inverse=True, return_counts=True)
+		meanReward = np.bincount(inverse, weights=rewards) / counts
+		meanValue = np.bincount(inverse, weights=values) / counts
+		q = self.q.reshape(-1)
+		visits = self.visits.reshape(-1)
+		if callable(alpha):
+			alpha = alpha(visits[keys])
+		old = q[keys]
+		q[keys] = np.where(visits[keys] == 0, meanReward, old + alpha * (meanValue - old))
+		visits[keys] += counts.astype(np.uint32)
+
+	def maxQ(self, state):
+		return max(self.q[state].tolist())
+
+	def bestAction(self, state, rng=random, bonus=0.0):
+	# Index of the action with the highest Q value, ties are broken randomly
+	# A single row is only a handful of values, comparing them as a list is cheaper than numpy calls
+	# With a bonus every action scores bonus / sqrt(1 + its visit count) extra
+
+		row = self.q[state].tolist()
+		if bonus:
+			row = [v + bonus / math.sqrt(1 + n) for v, n in zip(row, self.visits[state].tolist())]
+		maxQ = max(row)
+		if row.count(maxQ) > 1:
+			return rng.choice([i for i in range(self.numActions) if row[i] == maxQ])
+		return row.index(maxQ)
+
+	def bestActions(self, states, rng, bonus=0.0):
+	# bestAction for an array of states at once (rng is a numpy Generator)
+	# Every action tied for the max gets a random positive score, the rest 0, so argmax breaks ties uniformly
+
+		rows = self.q[states]
+		if bonus:
+			rows = rows + bonus / np.sqrt(1.0 + self.visits[states])
+		isMax = rows == rows.max(axis=1, keepdims=True)
+		return (rng.random(rows.shape) * isMax + isMax).argmax(axis=1)
+
+	def maxQs(self, states):
+		return self.q[states].max(axis=1)
+
+	def toDict(self):
+	# Same layout as the original dict model ({(state tuple, action): value}), only visited entries
+
+		return {(self.decode(int(s)), int(a)): float(self.q[s, a]) for s, a in zip(*np.nonzero(self.visits))}
+
+	def fromDict(self, d):
+		for (detected, action), value in d.items():
+			s = self.encode(detected)
+			self.q[s, action] = value
+			self.visits[s, action] = max(self.visits[s, action], 1)
+
+	def toArrays(self):
+		return self.q, self.visits
+
+	def loadArrays(self, q, visits, copy=True):
+	# Use Q values/visit counts loaded from a model file. Without copy the arrays are used as they are
+	# (e.g. read-only memory maps for play mode)
+
+		if q.shape != self.q.shape:
+			raise ValueError("model has shape %s but this table is %s" % (q.shape, self.q.shape))
+		if copy:
+			self.q[:] = q
+			self.visits[:] = visits
+		else:
+			self.q = q
+			self.visits = visits
+
+class DictQTable():
+# Original backend: dict keyed by (state tuple, action), missing entries are 0
+
+	def __init__(self, numEyes=5, numActions=5, numCodes=4):
+		self.numEyes = numEyes
+		self.numActions = numActions
+		self.q = {}
+
+	def encode(self, detected):
+		return tuple(detected)
+
+	def getQ(self, state, action):
+		return self.q.get((state, action), 0.0)
+
+	def learnQ(self, state, action, reward, value, alpha):
+	# Set reward for state/action or update existing reward
+
+		oldv = self.q.get((state, action), None)
+		if oldv is None:
+			self.q[(state, action)] = reward
+		else:
+			self.q[(state, action)] = oldv + alpha * (value - oldv)
+
+	def maxQ(self, state):
+		return max([self.getQ(state, a) for a in range(self.numActions)])
+
+	def bestAction(self, state, rng=random, bonus=0.0):
+	# No visit counts are kept, so there is no exploration bonus
+
+		q = [self.getQ(state, a) for a in range(self.numActions)]
+		maxQ = max(q)
+		count = q.count(maxQ)
+		if count > 1:
+			best = [i for i in range(self.numActions) if q[i] == maxQ]
+			return rng.choice(best)
+		return q.index(maxQ)
+
+	def toDict(self):
+		return dict(self.q)
+
+	def fromDict(self, d):
+		self.q = dict(d)
+
+	def toArrays(self):
+		table = QTable(self.numEyes, self.numActions)
+		table.fromDict(self.q)
+		return table.toArrays()
+
+	def loadArrays(self, q, visits, copy=True):
+		table = QTable(self.numEyes, self.numActions)
+		table.loadArrays(q, visits)
+		self.q = table.toDict()
+
+class SparseQTable(QTable):
+# Same state encoding and interface as QTable for eye counts whose full table wouldn't fit in
+# memory (15 eyes would be 4^15 rows). Only states that were updated get a row: a dict maps the
+# state number to a row of the q/visits arrays, which double in size when full. Row 0 stays
+# all zeros and stands in for every state that has no row yet
+
+	def __init__(self, numEyes=5, numActions=5, numCodes=4, capacity=1024):
+		self.numEyes = numEyes
+		self.numActions = numActions
+		self.numCodes = numCodes
+		self.numStates = numCodes ** numEyes
+		self.rows = {}
+		self.count = 1
+		self.keys = np.full(capacity, -1, dtype=np.int64)		# state number of each row
+		self.q = np.zeros((capacity, numActions))
+		self.visits = np.zeros((capacity, numActions), dtype=np.uint32)
+
+	def row(self, state):
+	# Row of state, added if it doesn't have one yet
+
+		r = self.rows.get(state)
+		if r is None:
+			if self.count == len(self.keys):
+				self.grow(2 * len(self.keys))
+			r = self.count
+			self.rows[state] = r
+			self.keys[r] = state
+			self.count += 1
+		return r
+
+	def grow(self, capacity):
+		keys = np.full(capacity, -1, dtype=np.int64)
+		q = np.zeros((capacity, self.numActions))
+		visits = np.zeros((capacity, self.numActions), dtype=np.uint32)
+		keys[:self.count] = self.keys[:self.count]
+		q[:self.count] = self.q[:self.count]
+		visits[:self.count] = self.visits[:self.count]
+		self.keys, self.q, self.visits = keys, q, visits
+
+	def lookup(self, states):
+	# Rows of an array of states (0 for states without a row)
+
+		rows = self.rows
+		return np.fromiter((rows.get(s, 0) for s in states.tolist()), dtype=np.int64, count=len(states))
+
+	def getQ(self, state, action):
+		return float(self.q[self.rows.get(state, 0), action])
+
+	def learnQ(self, state, action, reward, value, alpha):
+		QTable.learnQ(self, self.row(state), action, reward, value, alpha)
+
+	def learnBatch(self, states, actions, rewards, values, alpha):
+		rows = np.fromiter((self.row(s) for s in states.tolist()), dtype=np.int64, count=len(states))
+		QTable.learnBatch(self, rows, actions, rewards, values, alpha)
+
+	def maxQ(self, state):
+		return QTable.maxQ(self, self.rows.get(state, 0))
+
+	def bestAction(self, state, rng=random, bonus=0.0):
+		return QTable.bestAction(self, self.rows.get(state, 0), rng, bonus)
+
+	def bestActions(self, states, rng, bonus=0.0):
+		return QTable.bestActions(self, self.lookup(states), rng, bonus)
+
+	def maxQs(self, states):
+		return QTable.maxQs(self, self.lookup(states))
+
+	def toDict(self):
+		return {(self.decode(int(self.keys[r])), int(a)): float(self.q[r, a]) for r, a in zip(*np.nonzero(self.visits[:self.count]))}
+
+	def fromDict(self, d):
+		for (detected, action), value in d.items():
+			r = self.row(self.encode(detected))
+			self.q[r, action] = value
+			self.visits[r, action] = max(self.visits[r, action], 1)
+
+	def toSparse(self):
+	# (state numbers, q rows, visit rows) of every state that has a row
+
+		return self.keys[1:self.count], self.q[1:self.count], self.visits[1:self.count]
+
+	def loadSparse(self, keys, q, visits):
+		count = len(keys) + 1
+		self.rows = {}
+		self.count = 1
+		self.grow(max(count, 1024))
+		self.keys[1:count] = keys
+		self.q[1:count] = q
+		self.visits[1:count] = visits
+		self.rows = {int(s): r for r, s in enumerate(self.keys[1:count].tolist(), 1)}
+		self.count = count
+
+	def toArrays(self):
+		raise ValueError("a %d eye table is too big to store as a full array" % self.numEyes)
+
+	def loadArrays(self, q, visits, copy=True):
+		raise ValueError("a %d eye table is too big to load from a full array" % self.numEyes)
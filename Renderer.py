@@ -0,0 +1,97 @@
+import matplotlib
+from matplotlib.patches import Circle
+import matplotlib.pyplot as plt
+import warnings
+
+DOT_COLORS = {1: 'green', 2: 'red'}			# World.GREEN, World.RED
+EYE_COLORS = ['black', 'green', 'red', 'yellow']	# nothing, green dot, red dot, edge
+
+class Renderer():
+# Draws the world and agent in matplotlib. The renderer only observes the simulation core
+# (World and AgentState), the simulation never reads anything back from the artists
+# Frames are blitted: the field and dots are drawn once into a cached background and only
+# the agent, its eyes and the title are drawn over it each frame. The background is only
+# redrawn when dots have moved (or the window was resized)
+
+	def __init__(self, world, body):
+		# Ignore matplotlib deprecation warning - stackoverflow says this is the best fix for now
+		warnings.filterwarnings("ignore",".*GUI is implemented.*")
+
+		self.world = world
+		self.body = body
+
+		# Set up "field" in matplotlib
+		self.fig, self.ax = plt.subplots(1, 1)
+		self.ax.set_aspect('equal')
+		plt.ylim([0, world.size])
+		plt.xlim([0, world.size])
+		#plt.ion()
+		plt.show(block=False)
+		self.ax.set_yticklabels([])
+		self.ax.set_xticklabels([])
+
+		self.dotArtists = []
+		for i in range(len(world.dotX)):
+			artist = Circle((world.dotX[i], world.dotY[i]), world.dotRadius, color=DOT_COLORS[world.dotColor[i]])
+			self.ax.add_artist(artist)
+			self.dotArtists.append(artist)
+
+		self.circle = Circle((body.x, body.y), body.radius, color='blue', animated=True)
+		self.ax.add_artist(self.circle)
+		self.eyesPlot = []
+		for i in range(body.numEyes):
+			temp1, = self.ax.plot([body.x, body.eyeX[i]], [body.y, body.eyeY[i]], color='black', animated=True)
+			self.eyesPlot.append(temp1)
+		self.title = self.ax.set_title(" ", animated=True)
+		self.animated = [self.circle] + self.eyesPlot + [self.title]
+
+		# Every full draw (the first one, resizes, moved dots) refreshes the background
+		self.background = None
+		self.dotsDrawn = None
+		self.fig.canvas.mpl_connect('draw_event', self.onDraw)
+		self.redrawBackground()
+
+	def onDraw(self, event):
+		self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+
+	def redrawBackground(self):
+	# Full draw of everything that isn't animated, i.e. the field and the dots
+
+		for i, artist in enumerate(self.dotArtists):
+			artist.center = (self.world.dotX[i], self.world.dotY[i])
+		self.dotsDrawn = (self.world.dotX.copy(), self.world.dotY.copy())
+		self.fig.canvas.draw()
+
+	def sync(self, detected=None):
+	# Copy the current model state into the artists (dots only when they moved)
+
+		dotX, dotY = self.dotsDrawn
+		if len(dotX) != len(self.world.dotX) or (dotX != self.world.dotX).any() or (dotY != self.world.dotY).any():
+			self.redrawBackground()
+		self.circle.center = (self.body.x, self.body.y)
+		for i in range(self.body.numEyes):
+			self.eyesPlot[i].set_xdata([self.body.x, self.body.eyeX[i]])
+			self.eyesPlot[i].set_ydata([self.body.y, self.body.eyeY[i]])
+			if detected is not None:
+				# Change color of eyes depending on what they see
+				self.eyesPlot[i].set_color(EYE_COLORS[detected[i]])
+
+	def draw(self, delay=0, detected=None, title=None):
+	# Show the current state, then keep the window responsive for delay seconds
+
+		self.sync(detected)
+		if title is not None:
+			self.title.set_text(title)
+		canvas = self.fig.canvas
+		canvas.restore_region(self.background)
+		for artist in self.animated:
+			self.ax.draw_artist(artist)
+		canvas.blit(self.fig.bbox)
+		canvas.flush_events()
+		self.wait(delay)
+
+	def wait(self, seconds):
+	# Handle window events for the given time instead of sleeping
+
+		if seconds > 0:
+			self.fig.canvas.start_event_loop(seconds)
@@ -0,0 +1,111 @@
+import numpy as np
+import Schedule
+import trajectory
+
+class ReplayBuffer():
+# Bounded store of transitions (state, action, reward, next state) in preallocated arrays,
+# the oldest are overwritten once capacity is reached. Every `every` steps the agent gets
+# one minibatch update from batchSize transitions sampled uniformly, so every transition
+# is learned from many times instead of once (array backend only, see Agent.learnBatch)
+
+	def __init__(self, capacity, rng, batchSize=32, every=1):
+		self.capacity = capacity
+		self.rng = rng			# numpy Generator, see seeding
+		self.batchSize = batchSize
+		self.every = every
+		self.states = np.zeros(capacity, dtype=np.int64)
+		self.actions = np.zeros(capacity, dtype=np.int64)
+		self.rewards = np.zeros(capacity, dtype=np.float64)
+		self.nextStates = np.zeros(capacity, dtype=np.int64)
+		self.index = 0			# where the next transition goes
+		self.count = 0			# transitions stored
+
+	def __len__(self):
+		return self.count
+
+	def add(self, state, action, reward, nextState):
+		i = self.index
+		self.states[i] = state
+		self.actions[i] = action
+		self.rewards[i] = reward
+		self.nextStates[i] = nextState
+		self.index = (i + 1) % self.capacity
+		self.count = min(self.count + 1, self.capacity)
+
+	def addBatch(self, states, actions, rewards, nextStates):
+	# add for arrays of transitions (only the last capacity of them are kept)
+
+		n = len(states)
+		if n > self.capacity:
+			states, actions, rewards, nextStates = states[-self.capacity:], actions[-self.capacity:], rewards[-self.capacity:], nextStates[-self.capacity:]
+			n = self.capacity
+		at = (self.index + np.arange(n)) % self.capacity
+		self.states[at] = states
+		self.actions[at] = actions
+		self.rewards[at] = rewards
+		self.nextStates[at] = nextStates
+		self.index = (self.index + n) % self.capacity
+		self.count = min(self.count + n, self.capacity)
+
+	def sample(self, batchSize):
+		picks = self.rng.integers(0, self.count, batchSize)
+		return self.states[picks], self.actions[picks], self.rewards[picks], self.nextStates[picks]
+
+	def learn(self, agent):
+	# One minibatch update of agent's Q table (nothing until a full batch is stored)
+
+		if self.count >= self.batchSize:
+			agent.learnBatch(*self.sample(self.batchSize))
+
+	def toArrays(self):
+		return {'replayStates': self.states, 'replayActions': self.actions, 'replayRewards': self.rewards, 'replayNextStates': self.nextStates}
+
+	def loadArrays(self, arrays, index, count):
+		self.states[:] = arrays['replayStates']
+		self.actions[:] = arrays['replayActions']
+		self.rewards[:] = arrays['replayRewards']
+		self.nextStates[:] = arrays['replayNextStates']
+		self.index = index
+		self.count = count
+
+def countTransitions(filenames):
+# Transitions fromTrajectories gets out of the logs (one less than the STEP records of each log)
+
+	total = 0
+	for filename in filenames:
+		steps = sum(int((records['tag'] == trajectory.STEP).sum()) for records in trajectory.chunks(filename))
+		total += max(steps - 1, 0)
+	return total
+
+def fromTrajectories(filenames, capacity, rng, batchSize=32):
+# Buffer filled with the STEP records of trajectory logs. Transitions are paired up the way
+# Trainer learns online: the reward of step i is credited to the state and action of step i-1
+
+	replay = ReplayBuffer(capacity, rng, batchSize)
+	for filename in filenames:
+		last = None
+		for records in trajectory.chunks(filename):
+			steps = records[records['tag'] == trajectory.STEP]
+			if len(steps) == 0:
+				continue
+			states = steps['state'].astype(np.int64)
+			actions = steps['action'].astype(np.int64)
+			rewards = steps['reward'].astype(np.float64)
+			if last is not None:
+				replay.add(last[0], last[1], rewards[0], states[0])
+			replay.addBatch(states[:-1], actions[:-1], rewards[1:], states[1:])
+			last = (states[-1], actions[-1])
+	return replay
+
+def trainOffline(agent, replay, updates, report=0, schedule=None):
+# Learn from a filled buffer without simulating: updates minibatch updates, with the
+# learning rate following schedule (see Schedule) over them like it does over steps in Trainer
+
+	if schedule is None:
+		schedule = Schedule.Schedule(epsilon=agent.epsilon)
+	schedule.check(agent)
+	for k in range(updates):
+		schedule.apply(agent, k)
+		replay.learn(agent)
+		if report and (k + 1) % report == 0:
+			print("update=%d  meanQ=%.3f" % (k + 1, float(agent.q.q.mean())))
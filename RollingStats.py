@@ -0,0 +1,81 @@
+import time
+
+class RingBuffer():
+# Last size values with a running sum and sum of squares, so the mean and variance of the
+# window cost O(1) per new value instead of summing the whole window
+
+	def __init__(self, size):
+		self.size = size
+		self.values = [0] * size
+		self.index = 0
+		self.sum = 0
+		self.sumSq = 0
+
+	def push(self, value):
+		old = self.values[self.index]
+		self.values[self.index] = value
+		self.sum += value - old
+		self.sumSq += value * value - old * old
+		self.index += 1
+		if self.index == self.size:
+			self.index = 0
+			# Recompute once per lap so float rounding can't build up
+			self.sum = sum(self.values)
+			self.sumSq = sum(v * v for v in self.values)
+
+	def mean(self):
+		return self.sum / self.size
+
+	def variance(self):
+		mean = self.mean()
+		return max(self.sumSq / self.size - mean * mean, 0.0)
+
+	def load(self, values, index):
+		self.values = list(values)
+		self.size = len(self.values)
+		self.index = index
+		self.sum = sum(self.values)
+		self.sumSq = sum(v * v for v in self.values)
+
+class TrainStats():
+# Rolling training metrics: green ratio over the last dotWindow iterations, reward mean and
+# variance over the last rewardWindow iterations, and dots/iterations per second since
+# the last report
+
+	def __init__(self, dotWindow=5000, rewardWindow=1000):
+		self.dots = RingBuffer(dotWindow)
+		self.green = RingBuffer(dotWindow)
+		self.reward = RingBuffer(rewardWindow)
+		self.reset()
+
+	def reset(self):
+	# Start a new rate measurement (called after every report)
+
+		self.lastTime = time.time()
+		self.dotsSinceReport = 0
+		self.itersSinceReport = 0
+
+	def record(self, eaten, green, reward):
+		self.dots.push(eaten)
+		self.green.push(green)
+		self.reward.push(reward)
+		self.dotsSinceReport += eaten
+		self.itersSinceReport += 1
+
+	def ratio(self):
+		if self.dots.sum > 0:
+			return self.green.sum * 1.0 / self.dots.sum
+		return 0.0
+
+	def status(self, age):
+	# Summary of recent training shown in the window title
+
+		return "age=%d  ratio=%.3f  score=%.2f" % (age, self.ratio(), self.reward.mean())
+
+	def report(self, age):
+	# Longer summary printed when headless, also starts a new rate measurement
+
+		elapsed = max(time.time() - self.lastTime, 1e-9)
+		line = "%s  var=%.3f  dots/s=%.1f  iters/s=%.0f" % (self.status(age), self.reward.variance(), self.dotsSinceReport / elapsed, self.itersSinceReport / elapsed)
+		self.reset()
+		return line
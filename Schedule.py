@@ -0,0 +1,66 @@
+# How the learning rate and exploration change over a training run
+#   alpha 'global'	scale / (scale + age) for every update (what training always used)
+#   alpha 'visits'	scale / (scale + n), n being how often that state/action was updated before
+#					(the Q table's visit counts), so rare states keep learning quickly while
+#					common ones settle
+#   epsilon			decays from epsilon towards epsilonMin, halving the difference every
+#					epsilonHalfLife iterations (0 keeps it fixed)
+#   bonus			when choosing, every action gets bonus / sqrt(1 + n) added to its Q value
+#					(not stored), so actions tried less often in a state are picked more
+# Everything only depends on the age and the table, so a resumed run picks up where it stopped
+
+ALPHAS = ('global', 'visits')
+
+class Schedule():
+
+	def __init__(self, alpha='global', alphaScale=1000.0, epsilon=0.1, epsilonMin=0.0, epsilonHalfLife=0, bonus=0.0):
+		if alpha not in ALPHAS:
+			raise ValueError("Unknown alpha schedule '%s', schedules are: %s" % (alpha, ", ".join(ALPHAS)))
+		self.alpha = alpha
+		self.alphaScale = alphaScale
+		self.epsilon = epsilon
+		self.epsilonMin = epsilonMin
+		self.epsilonHalfLife = epsilonHalfLife
+		self.bonus = bonus
+
+	def needsVisits(self):
+		return self.alpha == 'visits' or self.bonus > 0
+
+	def check(self, agent):
+	# The dict backend keeps no visit counts
+
+		if self.needsVisits() and not hasattr(agent.q, 'visits'):
+			raise ValueError("Per-visit alpha and exploration bonuses need the array or sparse Q table backend")
+
+	def epsilonAt(self, age):
+		if self.epsilonHalfLife <= 0:
+			return self.epsilon
+		return self.epsilonMin + (self.epsilon - self.epsilonMin) * 0.5 ** (age / self.epsilonHalfLife)
+
+	def visitAlpha(self, visits):
+	# Learning rate of entries updated visits times before (a number or an array)
+
+		return self.alphaScale / (self.alphaScale + visits)
+
+	def apply(self, agent, age):
+	# Set the agent's learning rate, exploration rate and bonus for iteration age
+	# agent.alpha always holds the global rate (it is what model files record)
+
+		agent.alpha = self.alphaScale / (self.alphaScale + age)
+		agent.visitAlpha = self.visitAlpha if self.alpha == 'visits' else None
+		agent.epsilon = self.epsilonAt(age)
+		agent.bonus = self.bonus
+
+	def toDict(self):
+		return {'alpha': self.alpha, 'alphaScale': self.alphaScale, 'epsilon': self.epsilon,
+			'epsilonMin': self.epsilonMin, 'epsilonHalfLife': self.epsilonHalfLife, 'bonus': self.bonus}
+
+	def describe(self):
+		parts = ["alpha=%s/%g" % (self.alpha, self.alphaScale)]
+		if self.epsilonHalfLife > 0:
+			parts.append("epsilon=%g->%g (half-life %d)" % (self.epsilon, self.epsilonMin, self.epsilonHalfLife))
+		else:
+			parts.append("epsilon=%g" % self.epsilon)
+		if self.bonus > 0:
+			parts.append("bonus=%g" % self.bonus)
+		return "  ".join(parts)
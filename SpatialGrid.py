@@ -0,0 +1,53 @@
+import numpy as np
+
+class SpatialGrid():
+# Uniform grid over the field that buckets dot indices by the cell their center is in
+# so lookups only have to look at the few cells around a point instead of every dot
+
+	def __init__(self, size, cellSize):
+		self.size = size
+		self.cellSize = cellSize
+		self.numCells = int(size / cellSize) + 1	# cells per side
+		self.cells = {}					# cell key -> list of dot indices
+
+	def key(self, x, y):
+		cx = min(max(int(x / self.cellSize), 0), self.numCells - 1)
+		cy = min(max(int(y / self.cellSize), 0), self.numCells - 1)
+		return cx * self.numCells + cy
+
+	def insert(self, i, x, y):
+		self.cells.setdefault(self.key(x, y), []).append(i)
+
+	def remove(self, i, x, y):
+		k = self.key(x, y)
+		cell = self.cells[k]
+		cell.remove(i)
+		if not cell:
+			del self.cells[k]
+
+	def move(self, i, oldX, oldY, x, y):
+	# Update a dot's cell after it was relocated (nothing to do if it stays in the same cell)
+
+		oldK = self.key(oldX, oldY)
+		k = self.key(x, y)
+		if oldK != k:
+			self.remove(i, oldX, oldY)
+			self.cells.setdefault(k, []).append(i)
+
+	def query(self, xMin, yMin, xMax, yMax):
+	# Indices of every dot in the cells overlapping the box (may include some dots just outside it)
+
+		cxMin = max(int(xMin / self.cellSize), 0)
+		cyMin = max(int(yMin / self.cellSize), 0)
+		cxMax = min(int(xMax / self.cellSize), self.numCells - 1)
+		cyMax = min(int(yMax / self.cellSize), self.numCells - 1)
+		found = []
+		for cx in range(cxMin, cxMax + 1):
+			for cy in range(cyMin, cyMax + 1):
+				cell = self.cells.get(cx * self.numCells + cy)
+				if cell:
+					found.extend(cell)
+		return found
+
+	def queryArray(self, xMin, yMin, xMax, yMax):
+		return np.array(self.query(xMin, yMin, xMax, yMax), dtype=np.intp)
@@ -0,0 +1,165 @@
+import World
+import Instrument
+import RollingStats
+import Schedule
+import trajectory
+
+class Trainer():
+# State of a training run (world, agent and the recent stats) kept together so a run
+# can be advanced in chunks, e.g. by parallel workers that stop to merge Q tables
+# With learn=False the agent only acts (e.g. to evaluate a trained model)
+# A trajectory.Recorder, if given, gets every step and every dot that moved
+# With a ReplayBuffer every transition is also stored there and replayed in minibatches
+# A Schedule sets the learning rate and exploration every iteration (by default the global
+# alpha decay with the agent's epsilon fixed)
+
+	def __init__(self, world, body, agent, instrument=None, stats=None, learn=True, recorder=None, replay=None, schedule=None):
+		self.world = world
+		self.body = body
+		self.agent = agent
+		self.learn = learn
+		self.recorder = recorder
+		self.replay = replay
+		self.schedule = schedule if schedule is not None else Schedule.Schedule(epsilon=agent.epsilon)
+		if learn:
+			self.schedule.check(agent)
+		self.instrument = instrument if instrument is not None else Instrument.NullInstrument()
+		self.detected = world.dotDetected(body)
+		self.lastState = None
+		self.lastAction = None
+		self.score = 0					# Overall rewards
+		self.age = 0					# Age is number of iterations (actions)
+		self.stats = stats if stats is not None else RollingStats.TrainStats()
+		self.midEye = int(body.numEyes/2)
+
+	def doAction(self, action):
+	# Turn and/or move the agent and return the reward for how the move went (no dots yet)
+
+		body = self.body
+		midEye = self.midEye
+		reward = 0
+		if action == 0:					# Move straight forward
+			wallDist = body.distToWall(midEye)
+			moveDist = body.maxMove(midEye)
+			if  moveDist >= 0.025:			# Check if close to edge
+				body.move(0.025)
+				reward += 0.5			# Increase reward
+			elif moveDist > 0:			# Don't move beyond edge, lower reward for getting too close
+				body.move(moveDist)
+				reward += 0.5 * (1 - (0.025 - wallDist))
+			else:
+				reward -= 1.0
+		elif action == 1:				# Turn 15 deg CCW then forward
+			body.turn(15)
+			moveDist = body.maxMove(midEye)
+			if  moveDist >= 0.025:
+				body.move(0.025)
+			elif moveDist > 0:
+				body.move(moveDist)
+			else:
+				reward -= 1.0
+		elif action == 2:				# Turn 15 deg CW then forward
+			body.turn(-15)
+			moveDist = body.maxMove(midEye)
+			if  moveDist >= 0.025:
+				body.move(0.025)
+			elif moveDist > 0:
+				body.move(moveDist)
+			else:
+				reward -= 1.0
+		elif action == 3:				# Turn 30 deg CCW then forward a little
+			body.turn(30)
+			moveDist = body.maxMove(midEye)
+			if  moveDist >= 0.01:
+				body.move(0.01)
+			elif moveDist > 0:
+				body.move(moveDist)
+			else:
+				reward -= 1.0
+		elif action == 4:				# Turn 30 deg CW then forward a little
+			body.turn(-30)
+			moveDist = body.maxMove(midEye)
+			if  moveDist >= 0.01:
+				body.move(0.01)
+			elif moveDist > 0:
+				body.move(moveDist)
+			else:
+				reward -= 1.0
+		return reward
+
+	def step(self):
+	# One training iteration: act, eat dots, look again and learn
+
+		world = self.world
+		agent = self.agent
+		inst = self.instrument
+		age = self.age
+		inst.begin()
+		detected = self.detected
+		if self.learn:
+			self.schedule.apply(agent, age)
+		state = agent.encode(detected)		# State is what every eye sees
+		action = agent.chooseAction(state)
+		inst.mark('choose')
+		reward = self.doAction(action)
+		inst.mark('move')
+
+		absorbed = world.dotAbsorbed(self.body)
+		green = 0
+		for dot in absorbed:
+			if world.dotColor[dot] == World.RED:
+				reward += -6.0			# Penalized for eating red
+			else:
+				reward += 5.0			# Rewarded for eating green
+				green += 1
+		inst.mark('absorb')
+		for dot in absorbed:
+			world.relocate(dot)			# Relocate absorbed dot
+		inst.mark('relocate')
+
+		self.detected = world.dotDetected(self.body)
+		inst.mark('sense')
+
+		moved = world.ageDots(age)
+		inst.mark('age')
+		if self.recorder is not None:
+			self.recorder.dots(age, trajectory.EATEN, world, absorbed)
+			self.recorder.dots(age, trajectory.MOVED, world, moved)
+			self.recorder.step(age, detected, action, reward, self.detected, self.body)
+
+		# Learn based on last state/action, reward received, and current state
+		if self.learn and self.lastState is not None:
+			agent.learn(self.lastState, self.lastAction, reward, state)
+			replay = self.replay
+			if replay is not None:
+				replay.add(self.lastState, self.lastAction, reward, state)
+				if age % replay.every == 0:
+					replay.learn(agent)
+		self.lastState = state
+		self.lastAction = action
+
+		self.score += reward
+		self.stats.record(len(absorbed), green, reward)
+		self.age += 1
+		inst.mark('learn')
+
+	def run(self, iters, renderer=None, delay=0, renderEvery=1, quiet=False, checkpointer=None, reportEvery=5000):
+	# Train until age reaches iters
+	# With no renderer (headless) nothing is drawn and the loop runs as fast as it can
+	# Stats are only formatted when a frame is drawn or every reportEvery iterations when headless
+
+		inst = self.instrument
+		while self.age < iters:
+			self.step()
+			if checkpointer is not None:
+				checkpointer.maybeSave(self)
+			if renderer is not None and (self.age - 1) % renderEvery == 0:
+				inst.begin()
+				renderer.draw(delay, self.detected, self.status())
+				inst.mark('render')
+			elif renderer is None and not quiet and self.age % reportEvery == 0:
+				print(self.stats.report(self.age))
+			inst.tick(self.age)
+
+	def status(self):
+		return self.stats.status(self.age)
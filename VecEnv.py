@@ -0,0 +1,337 @@
+import numpy as np
+import CellTable
+import World
+import seeding
+
+# Per action: degrees to turn (CCW is positive) and how far to move forward afterwards
+TURNS = np.array([0.0, 15.0, -15.0, 30.0, -30.0])
+STEPS = np.array([0.025, 0.025, 0.025, 0.01, 0.01])
+
+# Offsets of a grid cell and its 8 neighbours
+AROUND_X = np.array([-1, -1, -1, 0, 0, 0, 1, 1, 1])
+AROUND_Y = np.array([-1, 0, 1, -1, 0, 1, -1, 0, 1])
+UNCLAIMED = np.iinfo(np.int64).max
+PLACE_CHUNK = 1 << 18		# most dots createWorlds places in one go (bounds the temporary arrays)
+FREE_CHUNK = 1 << 24		# most free-cell mask entries made in one go
+LOOKUP_COST = 8			# looking a grid cell up costs about as much as checking this many dots
+
+class VecEnv():
+# Many independent fields (and one agent body per field) stepped in lockstep
+# Every field has the same number of dots so the whole state fits in (envs x dots) and (envs x eyes) arrays
+# Dots are found by grid cell through one CellTable for all fields, so eating and sensing only
+# look at the cells around each agent and memory doesn't grow with the field's area
+
+	def __init__(self, numEnvs, seed=None, size=1.25, numDots=50, numEyes=5, viewDist=0.2, dotRadius=0.015, radius=0.025, maxGreen=30, greenChance=0.6):
+		self.numEnvs = numEnvs
+		self.genRng = seeding.makeNumpyRng(seed, 'world')		# numpy Generators, see seeding
+		self.relocRng = seeding.makeNumpyRng(seed, 'relocate')
+		self.size = size
+		self.numDots = numDots
+		self.dotRadius = dotRadius
+		self.radius = radius			# agent radius
+		self.maxGreen = maxGreen
+		self.greenChance = greenChance
+		self.numEyes = numEyes
+		self.viewDist = viewDist
+		self.midEye = int(numEyes / 2)
+
+		# Agents start in the middle facing up, like AgentState
+		body = World.AgentState(size, numEyes, viewDist, radius)
+		self.x = np.full(numEnvs, body.x)
+		self.y = np.full(numEnvs, body.y)
+		self.eyeX = np.tile(body.eyeX, (numEnvs, 1))
+		self.eyeY = np.tile(body.eyeY, (numEnvs, 1))
+		self.heading = np.full(numEnvs, body.heading)		# index into World.headingTables
+		dirTable, eyeTable = World.headingTables(numEyes, viewDist)
+		self.dirX, self.dirY = np.array(dirTable).T
+		self.eyeDX = np.array([dx for dx, dy in eyeTable])		# headings x eyes
+		self.eyeDY = np.array([dy for dx, dy in eyeTable])
+
+		self.createWorlds()
+
+	def createWorlds(self):
+	# Same as World.createWorld for every field: dots go to random free spots, at most maxGreen green
+	# Dots must be at least minSep apart on one axis, so a grid of minSep cells holds at most one
+	# dot per cell and a new dot only has to be checked against the dots of the 9 cells around it
+	# (the grid has an empty border so the cells around the edge ones always exist, and never
+	# holds a dot). The cells table maps cellKeys to the dot in that cell
+
+		n = self.numEnvs
+		self.cellSize = self.dotRadius * 2
+		self.numCells = int(self.size // self.cellSize) + 3		# cells per side, border included
+		self.cells = CellTable.CellTable(max(self.numDots - 1, 1).bit_length(), n * self.numDots)
+		self.dotX = np.full((n, self.numDots), -10.0)	# not placed yet, far from everything
+		self.dotY = np.full((n, self.numDots), -10.0)
+		self.dotExpiry = np.zeros((n, self.numDots), dtype=np.int64)	# iteration the dot is moved for being old
+		self.time = 0
+		chunk = max(PLACE_CHUNK // max(self.numDots, 1), 1)		# fields per placeDots call
+		for start in range(0, n, chunk):
+			envs = np.arange(start, min(start + chunk, n))
+			self.placeDots(np.repeat(envs, self.numDots), np.tile(np.arange(self.numDots), len(envs)), self.genRng)
+		green = self.genRng.random((n, self.numDots)) < self.greenChance
+		green &= np.cumsum(green, axis=1) <= self.maxGreen
+		self.dotColor = np.where(green, World.GREEN, World.RED).astype(np.int8)
+
+	def gridCells(self, x, y):
+		return (x // self.cellSize).astype(np.int64) + 1, (y // self.cellSize).astype(np.int64) + 1
+
+	def cellKeys(self, envs, cx, cy):
+	# Key of grid cell (cx, cy) of field envs in the cells table (arrays broadcast)
+
+		return (envs * self.numCells + cx) * self.numCells + cy
+
+	def cellDots(self, envs, x0, y0, width):
+	# Dots in the width x width grid cells from the one holding (x0, y0) of every field in envs,
+	# (fields x width * width) with -1 for empty cells. Cells off the grid are read as border cells
+
+		cx, cy = self.gridCells(x0, y0)
+		span = np.arange(width)
+		cx = np.clip(cx[:, None] + span, 0, self.numCells - 1)
+		cy = np.clip(cy[:, None] + span, 0, self.numCells - 1)
+		keys = self.cellKeys(envs[:, None, None], cx[:, :, None], cy[:, None, :])
+		return self.cells.lookup(keys.ravel()).reshape(len(envs), width * width)
+
+	def placeDots(self, envs, dots, rng):
+	# Move dot dots[k] of field envs[k] to a random free spot. Every pending dot tries a spot each
+	# round and keeps it unless it is too close to a dot or a dot with a lower k tried a spot in one
+	# of the 9 cells around it this round (claims holds the lowest k of every tried cell), so dots
+	# placed in the same round can't land on each other. The rest try again
+	# Like World.genRandPt the spots are uniform for UNIFORM_TRIES rounds, then come from free
+	# cells (see freeCellSpots) while there are any, and once PLACE_TRIES rounds without free
+	# cells in a row have placed nothing it gives up with a RuntimeError
+
+		minSep = self.dotRadius * 2
+		cells = self.cells
+		around = AROUND_X * self.numCells + AROUND_Y		# key offsets of the 9 cells
+		pending = np.arange(len(envs), dtype=np.int64)
+		rounds = 0
+		cellsLeft = True
+		stuck = 0			# rounds without free cells that placed nothing
+		while len(pending) > 0:
+			e = envs[pending]
+			x = rng.uniform(self.dotRadius, self.size - self.dotRadius, len(pending))
+			y = rng.uniform(self.dotRadius, self.size - self.dotRadius, len(pending))
+			if rounds >= World.UNIFORM_TRIES and cellsLeft:
+				cellsLeft = self.freeCellSpots(e, x, y, rng)
+			rounds += 1
+			cx, cy = self.gridCells(x, y)
+			keys = self.cellKeys(e, cx, cy)
+			aroundKeys = keys[:, None] + around
+			near = cells.lookup(aroundKeys.ravel()).reshape(-1, 9)		# pending x 9
+			nearX = np.where(near >= 0, self.dotX[e[:, None], near], -10.0)
+			nearY = np.where(near >= 0, self.dotY[e[:, None], near], -10.0)
+			tooClose = ((np.abs(nearX - x[:, None]) < minSep) & (np.abs(nearY - y[:, None]) < minSep)).any(axis=1)
+			tooClose |= near[:, 4] >= 0		# only possible through rounding, but keeps one dot per cell
+			if len(np.unique(e)) < len(e):		# claims only matter between dots of one field
+				tooClose |= (self.claims(keys, pending, aroundKeys) < pending[:, None]).any(axis=1)
+			ok = ~tooClose
+			e, d = e[ok], dots[pending[ok]]
+			placed = self.dotX[e, d] >= 0
+			oldX, oldY = self.gridCells(self.dotX[e, d][placed], self.dotY[e, d][placed])
+			cells.remove(self.cellKeys(e[placed], oldX, oldY))
+			self.dotX[e, d] = x[ok]
+			self.dotY[e, d] = y[ok]
+			cells.insert(keys[ok], d)
+			self.dotExpiry[e, d] = self.staleExpiries(len(d), rng)
+			pending = pending[tooClose]
+			if not cellsLeft:
+				stuck = 0 if len(d) > 0 else stuck + 1
+				if stuck >= World.PLACE_TRIES:
+					raise RuntimeError("No room left for a dot on a %g x %g field with %d dots" % (self.size, self.size, self.numDots))
+
+	def claims(self, keys, pending, aroundKeys):
+	# Lowest pending number that tried each of aroundKeys this round (UNCLAIMED for none)
+
+		order = np.argsort(keys, kind='stable')
+		sortedKeys = keys[order]
+		starts = np.flatnonzero(np.r_[True, sortedKeys[1:] != sortedKeys[:-1]])
+		tried = sortedKeys[starts]
+		lowest = np.minimum.reduceat(pending[order], starts)
+		i = np.minimum(np.searchsorted(tried, aroundKeys), len(tried) - 1)
+		return np.where(tried[i] == aroundKeys, lowest[i], UNCLAIMED)
+
+	def freeCellSpots(self, e, x, y, rng):
+	# Replace the spots (x, y) of dots going to fields e with random points in free cells, the
+	# cells World.FreeCells would have for those fields (cells one dot radius wide that no dot's
+	# keep-out box overlaps), so a field runs out of them when a World would. Dots of fields
+	# without a free cell keep their spot. Returns False if none had one
+	# Fields are done a few at a time so the cell masks stay small on big fields
+
+		margin = self.dotRadius
+		span = self.size - 2 * margin
+		numCells = max(int(-(-span // self.dotRadius)), 1)		# cells per side, as in FreeCells
+		cellSize = span / numCells
+		fields, index = np.unique(e, return_inverse=True)
+		chunk = max(FREE_CHUNK // (numCells * numCells), 1)
+		anyFree = False
+		for start in range(0, len(fields), chunk):
+			free = self.freeCells(fields[start:start + chunk], numCells, cellSize)
+			fieldCounts = free.sum(axis=(1, 2))
+			mine = (index >= start) & (index < start + chunk)
+			counts = np.zeros(len(e), dtype=np.int64)
+			counts[mine] = fieldCounts[index[mine] - start]
+			has = counts > 0
+			if not has.any():
+				continue
+			anyFree = True
+			cells = np.flatnonzero(free)			# (field, cell x, cell y) flattened, grouped by field
+			starts = (np.cumsum(fieldCounts) - fieldCounts)[index[has] - start]
+			pick = np.minimum(starts + (rng.random(has.sum()) * counts[has]).astype(np.int64), starts + counts[has] - 1)
+			cx, cy = np.divmod(cells[pick] % (numCells * numCells), numCells)
+			x[has] = margin + (cx + rng.random(len(cx))) * cellSize
+			y[has] = margin + (cy + rng.random(len(cy))) * cellSize
+		return anyFree
+
+	def freeCells(self, fields, numCells, cellSize):
+	# (fields x numCells x numCells) mask of the cells no dot's keep-out box overlaps
+
+		margin = self.dotRadius
+		minSep = self.dotRadius * 2
+		dotX = self.dotX[fields]
+		dotY = self.dotY[fields]
+		f, d = np.nonzero(dotX >= 0)		# dots placed so far
+		x0 = np.maximum(((dotX[f, d] - minSep - margin) // cellSize).astype(np.int64), 0)
+		x1 = np.minimum(((dotX[f, d] + minSep - margin) // cellSize).astype(np.int64) + 1, numCells)
+		y0 = np.maximum(((dotY[f, d] - minSep - margin) // cellSize).astype(np.int64), 0)
+		y1 = np.minimum(((dotY[f, d] + minSep - margin) // cellSize).astype(np.int64) + 1, numCells)
+		blocked = np.zeros((len(fields), numCells + 1, numCells + 1), dtype=bool)	# last row/column catches the clipped ones
+		width = int(2 * minSep // cellSize) + 2
+		for i in range(width):
+			bx = np.where(x0 + i < x1, x0 + i, numCells)
+			for j in range(width):
+				by = np.where(y0 + j < y1, y0 + j, numCells)
+				blocked[f, bx, by] = True
+		return ~blocked[:, :numCells, :numCells]
+
+	def staleExpiries(self, count, rng):
+	# World.staleExpiry for count dots placed now (geometric number of surviving checks)
+
+		firstCheck = -(-(self.time + World.STALE_AGE + 1) // World.STALE_CHECK) * World.STALE_CHECK
+		return firstCheck + World.STALE_CHECK * (rng.geometric(World.STALE_CHANCE, count) - 1)
+
+	def dotDetected(self):
+	# World.dotDetected for every field at once, returns an (envs x eyes) array of 0/1/2/3 codes
+	# In big fields only dots within reach of the eyes are looked at: they are packed (in order) into
+	# (envs x most near dots) arrays, padded with dots too far away to be seen. With many dots they
+	# are found through the grid cells within reach instead of checking every dot
+
+		wallDist = World.wallDistances(self.x[:, None], self.y[:, None], self.eyeX, self.eyeY, self.viewDist, self.size)
+		reach = self.viewDist + self.dotRadius
+		width = int(2 * reach // self.cellSize) + 2		# cells per side that can hold a dot within reach
+		if width * width * LOOKUP_COST < self.numDots:
+			envs = np.arange(self.numEnvs)[:, None]
+			near = self.cellDots(envs[:, 0], self.x - reach, self.y - reach, width)
+			near = np.sort(np.where(near >= 0, near, self.numDots), axis=1)
+			found = near < self.numDots
+			count = max(found.sum(axis=1).max(), 1)
+			near, found = near[:, :count], found[:, :count]
+			near[~found] = 0
+			A = np.where(found, self.dotX[envs, near] - self.x[:, None], 4 * reach)	# envs x near dots
+			B = np.where(found, self.dotY[envs, near] - self.y[:, None], 4 * reach)
+			colors = self.dotColor[envs, near]
+		else:
+			A = self.dotX - self.x[:, None]				# envs x dots
+			B = self.dotY - self.y[:, None]
+			colors = self.dotColor
+			if self.size > 4 * reach:
+				near = (np.abs(A) <= reach) & (np.abs(B) <= reach)
+				counts = near.sum(axis=1)
+				envs, dots = np.nonzero(near)
+				cols = np.arange(len(envs)) - (np.cumsum(counts) - counts)[envs]
+				shape = (self.numEnvs, max(counts.max(), 1))
+				nearA = np.full(shape, 4 * reach)		# envs x near dots
+				nearB = np.full(shape, 4 * reach)
+				colors = np.zeros(shape, dtype=self.dotColor.dtype)
+				nearA[envs, cols] = A[envs, dots]
+				nearB[envs, cols] = B[envs, dots]
+				colors[envs, cols] = self.dotColor[envs, dots]
+				A, B = nearA, nearB
+		C = self.eyeX - self.x[:, None]				# envs x eyes
+		D = self.eyeY - self.y[:, None]
+
+		# Closest point on every eye segment to every dot (envs x eyes x dots)
+		param = (C[:, :, None] * A[:, None, :] + D[:, :, None] * B[:, None, :]) / (C * C + D * D)[:, :, None]
+		np.clip(param, 0, 1, out=param)
+		dx = A[:, None, :] - param * C[:, :, None]
+		dy = B[:, None, :] - param * D[:, :, None]
+		seen = dx * dx + dy * dy < self.dotRadius * self.dotRadius
+
+		dotDist = np.sqrt(A * A + B * B) - self.dotRadius - self.radius
+		seenDist = np.where(seen, dotDist[:, None, :], np.inf)
+		closest = seenDist.argmin(axis=2)
+		closestDist = np.take_along_axis(seenDist, closest[:, :, None], axis=2)[:, :, 0]
+		hit = closestDist < np.minimum(wallDist, 99)
+		detected = np.where(wallDist < 99, World.EDGE, 0)
+		return np.where(hit, np.take_along_axis(colors, closest, axis=1), detected)
+
+	def turn(self, degrees):
+	# Turn every agent by its own angle (multiples of World.HEADING_STEP) and look its eyes up
+
+		self.heading = (self.heading + np.rint(degrees / World.HEADING_STEP).astype(np.int64)) % World.NUM_HEADINGS
+		self.eyeX = self.eyeDX[self.heading] + self.x[:, None]
+		self.eyeY = self.eyeDY[self.heading] + self.y[:, None]
+
+	def move(self, dist):
+	# Move every agent in the direction it is facing by its own distance
+
+		distX = self.dirX[self.heading] * dist
+		distY = self.dirY[self.heading] * dist
+		self.x += distX
+		self.y += distY
+		self.eyeX += distX[:, None]
+		self.eyeY += distY[:, None]
+
+	def step(self, actions, age):
+	# Apply one action per field and return (rewards, dots eaten, green dots eaten) per field
+	# Same rules as the single world train loop. Like there, old dots are only relocated by
+	# ageDots, after the fields have been sensed
+
+		self.turn(TURNS[actions])
+		mid = self.midEye
+		wallDist = World.wallDistances(self.x, self.y, self.eyeX[:, mid], self.eyeY[:, mid], self.viewDist, self.size)
+		moveDist = World.maxMoves(self.x, self.y, self.eyeX[:, mid], self.eyeY[:, mid], self.viewDist, self.size, self.radius)
+		step = STEPS[actions]
+		full = moveDist >= step
+		partial = ~full & (moveDist > 0)
+		self.move(np.where(full, step, np.where(partial, moveDist, 0.0)))
+
+		forward = actions == 0
+		rewards = np.where(full & forward, 0.5, 0.0)
+		rewards += np.where(partial & forward, 0.5 * (1 - (0.025 - wallDist)), 0.0)
+		rewards -= np.where(~full & ~partial, 1.0, 0.0)
+
+		# Dots whose center is inside the agent's box are eaten and moved somewhere else
+		envs, dots = self.absorbed()
+		eaten = np.bincount(envs, minlength=self.numEnvs)
+		greenEaten = np.bincount(envs[self.dotColor[envs, dots] == World.GREEN], minlength=self.numEnvs)
+		rewards += 5.0 * greenEaten - 6.0 * (eaten - greenEaten)
+		self.time = age
+		if len(envs) > 0:
+			self.placeDots(envs, dots, self.relocRng)
+		return rewards, eaten, greenEaten
+
+	def absorbed(self):
+	# (fields, dots) of the dots whose center is inside their agent's box, in field then dot order
+	# With many dots only the ones in the grid cells under the agent are looked at
+
+		width = int(2 * self.radius // self.cellSize) + 2
+		if width * width * LOOKUP_COST >= self.numDots:
+			return np.nonzero((np.abs(self.dotX - self.x[:, None]) < self.radius) & (np.abs(self.dotY - self.y[:, None]) < self.radius))
+		envs = np.arange(self.numEnvs)[:, None]
+		near = self.cellDots(envs[:, 0], self.x - self.radius, self.y - self.radius, width)
+		dots = np.maximum(near, 0)
+		inside = (near >= 0) & (np.abs(self.dotX[envs, dots] - self.x[:, None]) < self.radius) & (np.abs(self.dotY[envs, dots] - self.y[:, None]) < self.radius)
+		envs, dots = np.nonzero(inside)[0], dots[inside]
+		order = np.lexsort((dots, envs))
+		return envs[order], dots[order]
+
+	def ageDots(self, age):
+	# World.ageDots for every field: end of iteration age, relocate dots that have been sitting
+	# in place for too long (expiries are always multiples of STALE_CHECK so nothing can be due
+	# in between)
+
+		self.time = age + 1
+		if age % World.STALE_CHECK == 0:
+			envs, dots = np.nonzero(self.dotExpiry <= age)
+			if len(envs) > 0:
+				self.placeDots(envs, dots, self.relocRng)
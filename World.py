@@ -0,0 +1,464 @@
+import numpy as np
+import heapq
+import math
+import SpatialGrid
+import FreeCells
+import seeding
+
+# Dot color codes, the same numbers an eye reports when it sees that dot
+GREEN = 1
+RED = 2
+EDGE = 3
+
+# Dots older than STALE_AGE iterations get a STALE_CHANCE chance of being moved on every
+# iteration that is a multiple of STALE_CHECK
+STALE_AGE = 2500
+STALE_CHECK = 100
+STALE_CHANCE = 0.05
+
+# Placing a dot first tries UNIFORM_TRIES random spots anywhere on the field (the same
+# distribution as always), then takes a spot from a free cell, and only if no cell is
+# completely free any more tries up to PLACE_TRIES random spots before giving up
+UNIFORM_TRIES = 16
+PLACE_TRIES = 1000
+
+# Every turn the agent makes (15 and 30 degrees) is a multiple of HEADING_STEP degrees, so
+# headings are indices into tables of NUM_HEADINGS entries
+HEADING_STEP = 7.5
+NUM_HEADINGS = 48
+
+def staleExpiry(placed, u):
+# Iteration at which a dot placed at iteration placed gets moved for being old, given a
+# uniform random number u in [0, 1). The number of checks it survives once it is old
+# enough is geometric, so drawing it up front gives the same distribution as rolling
+# the dice at every check
+
+	firstCheck = -(-(placed + STALE_AGE + 1) // STALE_CHECK) * STALE_CHECK
+	return firstCheck + STALE_CHECK * int(math.log(1.0 - u) / math.log(1.0 - STALE_CHANCE))
+
+class World():
+# Simulation core for the field. Dots are kept as flat arrays (position, color code, the
+# iteration it was placed at and when it gets moved for being old) so nothing here depends
+# on how (or if) the world is drawn. Old dots are found through a heap of (expiry, dot)
+# events instead of aging every dot on every iteration
+
+	def __init__(self, size=1.25, seed=None, dotRadius=0.015):
+		self.size = size		# Field is a square from (0, 0) to (size, size)
+		self.genRng = seeding.makeRng(seed, 'world')
+		self.relocRng = seeding.makeRng(seed, 'relocate')
+		self.dotRadius = dotRadius
+		self.maxGreen = 30
+		self.greenChance = 0.6
+		self.dotX = np.zeros(0)
+		self.dotY = np.zeros(0)
+		self.dotColor = np.zeros(0, dtype=np.int8)
+		self.dotPlaced = np.zeros(0, dtype=np.int64)
+		self.dotExpiry = np.zeros(0, dtype=np.int64)
+		self.expiries = []
+		self.time = 0			# Current iteration, ageDots moves it forward
+		self.grid = SpatialGrid.SpatialGrid(size, self.dotRadius * 4)
+		self.freeCells = None		# built with the dots by createWorld/setDots (it's big on large fields)
+
+	def makeFreeCells(self):
+		return FreeCells.FreeCells(self.size, self.dotRadius, self.dotRadius * 2, self.dotRadius)
+
+	def createWorld(self, numDots=50, maxGreen=30, greenChance=0.6):
+	# Generates numDots dots to be "randomly" placed on the field, at most maxGreen of them green
+
+		self.dotX = np.zeros(numDots)
+		self.dotY = np.zeros(numDots)
+		self.dotColor = np.zeros(numDots, dtype=np.int8)
+		self.dotPlaced = np.zeros(numDots, dtype=np.int64)
+		self.dotExpiry = np.zeros(numDots, dtype=np.int64)
+		self.expiries = []
+		self.time = 0
+		self.maxGreen = maxGreen
+		self.greenChance = greenChance
+		self.grid = SpatialGrid.SpatialGrid(self.size, self.dotRadius * 4)
+		self.freeCells = self.makeFreeCells()
+		gc = 0
+		for i in range(numDots):
+			x, y = self.genRandPt(self.genRng)
+			self.dotX[i] = x
+			self.dotY[i] = y
+			self.dotColor[i], gc = self.createDot(gc)
+			self.grid.insert(i, x, y)
+			self.freeCells.block(x, y)
+			self.schedule(i)
+
+	def setDots(self, dotX, dotY, dotColor, dotPlaced, dotExpiry, time):
+	# Replace all dots (e.g. from a checkpoint) and rebuild the grid and expiry heap
+
+		self.dotX = np.array(dotX, dtype=np.float64)
+		self.dotY = np.array(dotY, dtype=np.float64)
+		self.dotColor = np.array(dotColor, dtype=np.int8)
+		self.dotPlaced = np.array(dotPlaced, dtype=np.int64)
+		self.dotExpiry = np.array(dotExpiry, dtype=np.int64)
+		self.time = time
+		self.grid = SpatialGrid.SpatialGrid(self.size, self.dotRadius * 4)
+		self.freeCells = self.makeFreeCells()
+		for i in range(len(self.dotX)):
+			self.grid.insert(i, self.dotX[i], self.dotY[i])
+			self.freeCells.block(self.dotX[i], self.dotY[i])
+		self.rebuildExpiries()
+
+	def dotAges(self):
+	# Iterations each dot has been sitting in place
+
+		return self.time - self.dotPlaced
+
+	def schedule(self, i):
+	# Dot i was just placed, decide when it will be moved for being old
+
+		expiry = staleExpiry(self.time, self.relocRng.random())
+		self.dotPlaced[i] = self.time
+		self.dotExpiry[i] = expiry
+		heapq.heappush(self.expiries, (expiry, i))
+		# Every relocation leaves a dead entry behind, drop them once they outnumber the dots
+		if len(self.expiries) > 2 * len(self.dotExpiry) + 64:
+			self.rebuildExpiries()
+
+	def rebuildExpiries(self):
+		self.expiries = list(zip(self.dotExpiry.tolist(), range(len(self.dotExpiry))))
+		heapq.heapify(self.expiries)
+
+	def genRandPt(self, rng):
+	# Generates a random point that isn't too close to any dot in a bounded number of tries
+	# A few random spots are tried first, on a crowded field the point comes from a cell no
+	# dot is near instead. Raises RuntimeError if the field is too full to fit another dot
+
+		for _ in range(UNIFORM_TRIES):
+			x = rng.uniform(self.dotRadius, self.size - self.dotRadius)
+			y = rng.uniform(self.dotRadius, self.size - self.dotRadius)
+			if self.isFree(x, y):
+				return x, y
+		pt = self.freeCells.sample(rng)
+		if pt is not None:
+			return pt
+		for _ in range(PLACE_TRIES):
+			x = rng.uniform(self.dotRadius, self.size - self.dotRadius)
+			y = rng.uniform(self.dotRadius, self.size - self.dotRadius)
+			if self.isFree(x, y):
+				return x, y
+		raise RuntimeError("No room left for a dot on a %g x %g field with %d dots" % (self.size, self.size, len(self.dotX)))
+
+	def isFree(self, x, y):
+	# True if (x, y) is far enough from every dot (only dots in the grid cells around it are checked)
+
+		minSep = self.dotRadius * 2
+		for i in self.grid.query(x - minSep, y - minSep, x + minSep, y + minSep):
+			if abs(self.dotX[i] - x) < minSep and abs(self.dotY[i] - y) < minSep:
+				return False
+		return True
+
+	def createDot(self, gc):
+	# Picks the color of a new dot with a greenChance chance of being green (60% by default)
+
+		if self.genRng.random() < self.greenChance and gc < self.maxGreen:
+			return GREEN, gc + 1
+		return RED, gc
+
+	def relocate(self, i):
+	# Moves dot i to a new free spot (instead of deleting and creating a new one)
+
+		x, y = self.genRandPt(self.relocRng)
+		self.grid.move(i, self.dotX[i], self.dotY[i], x, y)
+		self.freeCells.unblock(self.dotX[i], self.dotY[i])
+		self.freeCells.block(x, y)
+		self.dotX[i] = x
+		self.dotY[i] = y
+		self.schedule(i)
+
+	def ageDots(self, age):
+	# End of iteration age: relocate dots that have been sitting in place for too long and
+	# return which ones moved. Only dots whose expiry is due are touched, entries left by
+	# earlier relocations are skipped
+
+		self.time = age + 1
+		expiries = self.expiries
+		moved = []
+		while expiries and expiries[0][0] <= age:
+			expiry, i = heapq.heappop(expiries)
+			if self.dotExpiry[i] == expiry:
+				self.relocate(i)
+				moved.append(i)
+		return moved
+
+	def dotDetected(self, body):
+	# Finds what objects each eye can see but only returns the closest ones
+	# 0 = nothing, 1 = green dot, 2 = red dot, 3 = edge
+	# Same result as dotDetectedScalar but every eye/dot pair is tested at once with numpy
+
+		wallDist = body.wallDistances()
+		detected = np.where(wallDist < 99, EDGE, 0)
+
+		# Only dots in grid cells the eyes can reach are candidates (sorted so ties go to
+		# the lowest index like the full scan)
+		near = np.sort(self.grid.queryArray(min(body.x, body.eyeX.min()) - self.dotRadius, min(body.y, body.eyeY.min()) - self.dotRadius,
+				max(body.x, body.eyeX.max()) + self.dotRadius, max(body.y, body.eyeY.max()) + self.dotRadius))
+		if len(near) > 0:
+			# Dot centers and eye ends relative to the agent (the eyes all start at its center)
+			A = self.dotX[near] - body.x
+			B = self.dotY[near] - body.y
+			C = body.eyeX - body.x
+			D = body.eyeY - body.y
+
+			# Closest point on every eye segment to every dot (eyes x dots)
+			param = (np.outer(C, A) + np.outer(D, B)) / (C * C + D * D)[:, None]
+			np.clip(param, 0, 1, out=param)
+			dx = A - param * C[:, None]
+			dy = B - param * D[:, None]
+			seen = dx * dx + dy * dy < self.dotRadius * self.dotRadius
+
+			# Keep the closest seen dot for each eye, it only counts if it is closer than the edge
+			dotDist = np.sqrt(A * A + B * B) - self.dotRadius - body.radius
+			seenDist = np.where(seen, dotDist, np.inf)
+			closest = seenDist.argmin(axis=1)
+			closestDist = seenDist[np.arange(body.numEyes), closest]
+			hit = closestDist < np.minimum(wallDist, 99)
+			detected = np.where(hit, self.dotColor[near[closest]], detected)
+		return detected.tolist()
+
+	def dotDetectedScalar(self, body):
+	# Reference version of dotDetected that checks one eye/dot pair at a time
+
+		# Plain lists are much cheaper to index one element at a time than numpy arrays
+		dots = list(zip(self.dotX.tolist(), self.dotY.tolist(), self.dotColor.tolist()))
+		eyeX = body.eyeX.tolist()
+		eyeY = body.eyeY.tolist()
+		x, y, r = body.x, body.y, self.dotRadius
+		dist = [99] * body.numEyes
+		detected = [0] * body.numEyes
+		for i in range(body.numEyes):
+			tempDist = body.distToWall(i)
+			if tempDist < 99:
+				detected[i] = EDGE
+				dist[i] = tempDist
+			for dotX, dotY, color in dots:
+				if eyeSeeDot(dotX, dotY, r, x, y, eyeX[i], eyeY[i]):
+					tempDist = pt2ptDist(dotX, dotY, x, y, r, body.radius)
+					if tempDist < dist[i]:
+						dist[i] = tempDist
+						detected[i] = color
+		return detected
+
+	def dotAbsorbed(self, body):
+	# Checks if agent (circle) contains the point at the center of a dot
+	# Dots are NOT eaten if the two circles simply overlap, it must engulf the center of the dot
+
+		absorbed = []
+		for i in sorted(self.grid.query(body.x - body.radius, body.y - body.radius, body.x + body.radius, body.y + body.radius)):
+			if (body.x - body.radius < self.dotX[i] < body.x + body.radius) and (body.y - body.radius < self.dotY[i] < body.y + body.radius):
+				absorbed.append(i)
+		return absorbed
+
+class AgentState():
+# Pose of the agent: center, heading and the far end of each eye (the near end is the center)
+# Every action turns by a multiple of HEADING_STEP, so the heading is kept as an index into
+# precomputed tables and turning or moving needs no trig. Any other turn (e.g. a random
+# start pose) falls back to rotating the eyes and leaves heading as None
+
+	def __init__(self, fieldSize, numEyes=5, viewDist=0.2, radius=0.025):
+		self.fieldSize = fieldSize
+		self.radius = radius
+		self.numEyes = numEyes
+		self.viewDist = viewDist
+		self.viewAngle = 60.0 / (self.numEyes - 1)
+		self.dirTable, self.eyeTable = headingTables(numEyes, viewDist)
+		self.setPose(fieldSize / 2, fieldSize / 2, math.pi / 2)
+
+	def setPose(self, x, y, angle):
+	# Put the agent at (x, y) facing angle (radians CCW from the +x axis)
+
+		self.x = x
+		self.y = y
+		steps = angle * 180 / math.pi / HEADING_STEP
+		if abs(steps - round(steps)) < 1e-9:
+			self.setHeading(int(round(steps)) % NUM_HEADINGS)
+		else:
+			self.heading = None
+			self.angle = angle % (2 * math.pi)
+			self.dirX = math.cos(angle)
+			self.dirY = math.sin(angle)
+			eyeAngles = angle + (30.0 - np.arange(self.numEyes) * self.viewAngle) * math.pi / 180
+			self.eyeX = x + np.cos(eyeAngles) * self.viewDist
+			self.eyeY = y + np.sin(eyeAngles) * self.viewDist
+
+	def setHeading(self, heading):
+		self.heading = heading
+		self.angle = heading * HEADING_STEP * math.pi / 180
+		self.dirX, self.dirY = self.dirTable[heading]
+		eyeDX, eyeDY = self.eyeTable[heading]
+		self.eyeX = eyeDX + self.x
+		self.eyeY = eyeDY + self.y
+
+	def move(self, dist):
+	# Move agent in direction of center eye by specified distance
+
+		distx = self.dirX * dist
+		disty = self.dirY * dist
+		self.x += distx
+		self.y += disty
+		self.eyeX += distx
+		self.eyeY += disty
+
+	def turn(self, angle):
+	# Turn agent in place by specified angle (degrees CCW)
+
+		steps = angle / HEADING_STEP
+		if self.heading is not None and steps == int(steps):
+			self.setHeading((self.heading + int(steps)) % NUM_HEADINGS)
+			return
+		angle = angle * math.pi / 180
+		cos = math.cos(angle)
+		sin = math.sin(angle)
+		dx = self.eyeX - self.x
+		dy = self.eyeY - self.y
+		self.eyeX = dx * cos - dy * sin + self.x
+		self.eyeY = dx * sin + dy * cos + self.y
+		self.dirX, self.dirY = self.dirX * cos - self.dirY * sin, self.dirX * sin + self.dirY * cos
+		self.angle = (self.angle + angle) % (2 * math.pi)
+		self.heading = None
+
+	def atEdge(self):
+	# Check if any eyes see far enough beyond and edge that the agent is at the edge
+
+		for i in range(self.numEyes):
+			if not (-self.viewDist + self.radius * 2 < self.eyeX[i] < self.fieldSize + self.viewDist - self.radius * 2 ) or \
+			not (-self.viewDist + self.radius * 2 < self.eyeY[i] < self.fieldSize + self.viewDist - self.radius * 2):
+				return True
+		return False
+
+	def nearEdge(self):
+	# Check if any eyes see any distance beyond an edge
+
+		for i in range(self.numEyes):
+			if not (0 < self.eyeX[i] < self.fieldSize) or not (-0 < self.eyeY[i] < self.fieldSize):
+				return True
+		return False
+
+	def distToWall(self, i):
+	# Finds distance to edge of field since eyes can see beyond the edges
+	# That is where the eye's ray leaves the field: how far the eye reaches past the edge
+	# divided by the eye's direction component across it (x edges are checked first)
+
+		x1 = float(self.eyeX[i])
+		y1 = float(self.eyeY[i])
+		if x1 < 0 or x1 > self.fieldSize:
+			over = -x1 if x1 < 0 else x1 - self.fieldSize
+			u = min(abs(x1 - self.x) / self.viewDist, 1)
+		elif y1 < 0 or y1 > self.fieldSize:
+			over = -y1 if y1 < 0 else y1 - self.fieldSize
+			u = min(abs(y1 - self.y) / self.viewDist, 1)
+		else:
+			return 99
+		if u == 0:
+			return self.viewDist - over
+		return self.viewDist - over / u
+
+	def wallDistances(self):
+	# distToWall for every eye at once, 99 where an eye doesn't reach past an edge
+
+		return wallDistances(self.x, self.y, self.eyeX, self.eyeY, self.viewDist, self.fieldSize)
+
+	def maxMove(self, i):
+	# Finds maximum move distance possible before agent goes out of bounds
+	# Only applies if agent is near edge (i.e. eyes can see beyond edge)
+	# Distance along eye i until the agent's edge touches the wall the eye reaches past
+
+		x1 = float(self.eyeX[i])
+		y1 = float(self.eyeY[i])
+		if x1 < 0 or x1 > self.fieldSize:
+			over = -x1 if x1 < 0 else x1 - self.fieldSize
+			d = abs(x1 - self.x)
+		elif y1 < 0 or y1 > self.fieldSize:
+			over = -y1 if y1 < 0 else y1 - self.fieldSize
+			d = abs(y1 - self.y)
+		else:
+			return 99
+		u = min(d / self.viewDist, 1)
+		if u == 0:
+			return self.viewDist - over
+		return (d - over - self.radius) / u
+
+_headingTables = {}
+
+def headingTables(numEyes, viewDist):
+# Per heading index h (h * HEADING_STEP degrees CCW from +x): the unit direction the agent
+# moves in and the offsets of its eye ends from its center. Shared by all agents with the
+# same eyes
+
+	key = (numEyes, viewDist)
+	if key not in _headingTables:
+		viewAngle = 60.0 / (numEyes - 1)
+		headings = np.arange(NUM_HEADINGS) * HEADING_STEP * math.pi / 180
+		eyeAngles = headings[:, None] + (30.0 - np.arange(numEyes) * viewAngle) * math.pi / 180
+		dirTable = [(math.cos(a), math.sin(a)) for a in headings.tolist()]
+		eyeTable = [(dx, dy) for dx, dy in zip(np.cos(eyeAngles) * viewDist, np.sin(eyeAngles) * viewDist)]
+		_headingTables[key] = (dirTable, eyeTable)
+	return _headingTables[key]
+
+def wallDistances(x, y, eyeX, eyeY, viewDist, fieldSize):
+# Array version of AgentState.distToWall, works on any shape that broadcasts (e.g. envs x eyes)
+# sin(asin(u)) and cos(acos(u)) cancel out so no trig is needed
+
+	ux = np.minimum(np.abs(eyeX - x) / viewDist, 1)
+	uy = np.minimum(np.abs(eyeY - y) / viewDist, 1)
+	overX = np.where(eyeX < 0, -eyeX, eyeX - fieldSize)
+	overY = np.where(eyeY < 0, -eyeY, eyeY - fieldSize)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		distX = viewDist - np.where(ux > 0, overX / ux, overX)
+		distY = viewDist - np.where(uy > 0, overY / uy, overY)
+	# x edges are checked before y edges, same as distToWall
+	return np.where(overX > 0, distX, np.where(overY > 0, distY, 99.0))
+
+def maxMoves(x, y, eyeX, eyeY, viewDist, fieldSize, radius):
+# Array version of AgentState.maxMove, 99 where the eye doesn't reach past an edge
+
+	dx = np.abs(eyeX - x)
+	dy = np.abs(eyeY - y)
+	ux = np.minimum(dx / viewDist, 1)
+	uy = np.minimum(dy / viewDist, 1)
+	overX = np.where(eyeX < 0, -eyeX, eyeX - fieldSize)
+	overY = np.where(eyeY < 0, -eyeY, eyeY - fieldSize)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		distX = np.where(ux > 0, (dx - overX - radius) / ux, viewDist - overX)
+		distY = np.where(uy > 0, (dy - overY - radius) / uy, viewDist - overY)
+	return np.where(overX > 0, distX, np.where(overY > 0, distY, 99.0))
+
+def pt2ptDist(x1, y1, x2, y2, radius1, radius2):
+# Distance between agent and dot
+
+	dist = math.sqrt(math.pow(x2-x1, 2) + math.pow(y2-y1, 2))
+	dist = dist - radius1 - radius2
+	return dist
+
+def eyeSeeDot(dotX, dotY, radius, x0, y0, x1, y1):
+# Determines if an eye (segment from (x0, y0) to (x1, y1)) can "see" a dot by checking if line segment intersects a circle
+# Finds distance from a point (center of dot) to line segment
+# then checks if distance is less than the radius of the dot
+
+	A = dotX - x0
+	B = dotY - y0
+	C = x1 - x0
+	D = y1 - y0
+
+	dotprod = A * C + B * D
+	lenSq = C * C + D * D
+	param = dotprod / lenSq
+
+	if param < 0:
+		xx = x0
+		yy = y0
+	elif param > 1:
+		xx = x1
+		yy = y1
+	else:
+		xx = x0 + param * C
+		yy = y0 + param * D
+
+	dx = dotX - xx
+	dy = dotY - yy
+
+	dist = math.sqrt(dx * dx + dy * dy)
+	return dist < radius
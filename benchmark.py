@@ -0,0 +1,150 @@
+import numpy as np
+import argparse
+import json
+import math
+import platform
+import time
+import Agent
+import World
+import Trainer
+import VecEnv
+import seeding
+
+# Times the simulator's hot paths across world sizes, eye counts, view distances and backends
+# and writes the results as JSON so runs from different versions can be compared
+
+def timeit(fn, minTime):
+# Calls fn in growing batches until one batch takes at least minTime seconds
+# Returns (calls, seconds) of that batch
+
+	calls = 1
+	while True:
+		start = time.perf_counter()
+		for _ in range(calls):
+			fn()
+		elapsed = time.perf_counter() - start
+		if elapsed >= minTime:
+			return calls, elapsed
+		calls *= 2
+
+def makeWorld(numDots, seed):
+# Keep the dot density of the default field (50 dots on 1.25 x 1.25) as the dot count grows
+
+	world = World.World(1.25 * math.sqrt(numDots / 50.0), seed)
+	world.createWorld(numDots)
+	return world
+
+def makeBodies(world, numEyes, viewDist, seed, count=64):
+# Agents at random positions and headings across the field so sensing isn't timed at one spot
+
+	rng = seeding.makeRng(seed, 'benchmark')
+	bodies = []
+	for i in range(count):
+		body = World.AgentState(world.size, numEyes, viewDist)
+		x = rng.uniform(body.radius, world.size - body.radius)
+		y = rng.uniform(body.radius, world.size - body.radius)
+		body.setPose(x, y, body.angle + math.radians(rng.uniform(0, 360)))
+		bodies.append(body)
+	return bodies
+
+def cycle(items, fn):
+# Returns a function that calls fn on the next item every time it is called
+
+	state = [0]
+	def call():
+		fn(items[state[0] % len(items)])
+		state[0] += 1
+	return call
+
+def benchSensing(results, dots, eyes, viewDists, minTime, seed):
+	for numDots in dots:
+		world = makeWorld(numDots, seed)
+		for numEyes in eyes:
+			for viewDist in viewDists:
+				bodies = makeBodies(world, numEyes, viewDist, seed)
+				params = {'dots': numDots, 'eyes': numEyes, 'viewDist': viewDist}
+				record(results, 'dotDetected', dict(params, backend='vectorized'), timeit(cycle(bodies, world.dotDetected), minTime))
+				record(results, 'dotDetected', dict(params, backend='scalar'), timeit(cycle(bodies, world.dotDetectedScalar), minTime))
+		bodies = makeBodies(world, 5, 0.2, seed)
+		record(results, 'dotAbsorbed', {'dots': numDots}, timeit(cycle(bodies, world.dotAbsorbed), minTime))
+		record(results, 'genRandPt', {'dots': numDots}, timeit(lambda: world.genRandPt(world.relocRng), minTime))
+
+def benchAgent(results, eyes, backends, minTime, seed):
+	for numEyes in eyes:
+		for backend in backends:
+			agent = Agent.Agent(numEyes, backend, seed)
+			rng = seeding.makeRng(seed, 'benchmark')
+			states = [agent.encode([rng.randrange(4) for _ in range(numEyes)]) for _ in range(1024)]
+			params = {'eyes': numEyes, 'backend': backend}
+			record(results, 'chooseAction', params, timeit(cycle(states, agent.chooseAction), minTime))
+			pairs = list(zip(states, states[1:] + states[:1]))
+			record(results, 'learn', params, timeit(cycle(pairs, lambda p: agent.learn(p[0], 1, 0.5, p[1])), minTime))
+
+def benchTrainStep(results, dots, eyes, backends, minTime, seed):
+	for numDots in dots:
+		for numEyes in eyes:
+			for backend in backends:
+				world = makeWorld(numDots, seed)
+				body = World.AgentState(world.size, numEyes)
+				trainer = Trainer.Trainer(world, body, Agent.Agent(numEyes, backend, seed))
+				record(results, 'trainStep', {'dots': numDots, 'eyes': numEyes, 'backend': backend}, timeit(trainer.step, minTime))
+
+def benchVecEnv(results, envs, minTime, seed):
+	for numEnvs in envs:
+		env = VecEnv.VecEnv(numEnvs, seed)
+		agent = Agent.Agent(env.numEyes, seed=seed)
+		rng = seeding.makeNumpyRng(seed, 'explore')
+		age = [0]
+		def step():
+			actions = agent.chooseActions(agent.q.encodeAll(env.dotDetected()), rng)
+			env.step(actions, age[0])
+			env.ageDots(age[0])
+			age[0] += 1
+		calls, seconds = timeit(step, minTime)
+		record(results, 'vecEnvStep', {'envs': numEnvs}, (calls, seconds), numEnvs)
+
+def record(results, name, params, timing, stepsPerCall=1):
+	calls, seconds = timing
+	entry = {
+		'name': name,
+		'params': params,
+		'calls': calls,
+		'seconds': seconds,
+		'usPerCall': seconds / calls * 1e6,
+		'perSec': calls * stepsPerCall / seconds,
+	}
+	results.append(entry)
+	print("%-14s %-60s %12.2f us/call %14.0f /s" % (name, json.dumps(params, sort_keys=True), entry['usPerCall'], entry['perSec']))
+
+def run(quick=False, seed=0):
+	minTime = 0.05 if quick else 0.25
+	if quick:
+		dots, eyes, viewDists = [50, 500], [5, 15], [0.2]
+	else:
+		dots, eyes, viewDists = [50, 500, 5000], [5, 15, 45], [0.2, 0.5]
+	results = []
+	benchSensing(results, dots, eyes, viewDists, minTime, seed)
+	benchAgent(results, [5, 9], ['dict', 'array'], minTime, seed)
+	benchTrainStep(results, dots, [5], ['dict', 'array'], minTime, seed)
+	benchVecEnv(results, [1, 64] if quick else [1, 64, 1024], minTime, seed)
+	return {
+		'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+		'python': platform.python_version(),
+		'numpy': np.__version__,
+		'machine': platform.machine(),
+		'processor': platform.processor(),
+		'seed': seed,
+		'results': results,
+	}
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Benchmark simulator throughput")
+	parser.add_argument("-o", "--output", help="JSON file to write the results to", required=False, default="benchmark.json")
+	parser.add_argument("--quick", help="Smaller sweep with shorter timings", required=False, action="store_true")
+	parser.add_argument("--seed", help="Seed for the benchmark worlds and agents", required=False, type=int, default=0)
+	args = vars(parser.parse_args())
+
+	report = run(args['quick'], args['seed'])
+	with open(args['output'], 'w') as f:
+		json.dump(report, f, indent=1)
+	print("Wrote %d results to %s" % (len(report['results']), args['output']))
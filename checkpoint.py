@@ -0,0 +1,165 @@
+import numpy as np
+import json
+import os
+import queue
+import threading
+import time
+import QTable
+
+# A checkpoint is an .npz file with the Q table, world and stats buffers as arrays and the
+# rest of the run (age, pose, last state/action, RNG state) as a JSON string, so loading
+# one never needs pickle
+
+def snapshot(trainer):
+# Copy everything needed to continue the run, cheap enough to do inside the training loop
+
+	world = trainer.world
+	body = trainer.body
+	agent = trainer.agent
+	keys = None
+	if isinstance(agent.q, QTable.SparseQTable):
+		keys, q, visits = agent.q.toSparse()
+	else:
+		q, visits = agent.q.toArrays()
+	lastState = trainer.lastState
+	if isinstance(lastState, tuple):
+		lastState = list(lastState)
+	meta = {
+		'age': trainer.age,
+		'score': trainer.score,
+		'lastState': lastState,
+		'lastAction': trainer.lastAction,
+		'detected': list(trainer.detected),
+		'epsilon': agent.epsilon,
+		'bodyX': body.x,
+		'bodyY': body.y,
+		'angle': body.angle,
+		'worldTime': world.time,
+		'statsIndex': [trainer.stats.dots.index, trainer.stats.green.index, trainer.stats.reward.index],
+		'rngStates': [world.genRng.getstate(), world.relocRng.getstate(), agent.rng.getstate()],
+	}
+	replay = trainer.replay
+	if replay is not None:
+		meta['replay'] = {'index': replay.index, 'count': replay.count, 'rngState': replay.rng.bit_generator.state}
+	snap = {
+		'meta': np.array(json.dumps(meta)),
+		'q': q.copy(),
+		'visits': visits.copy(),
+		'dotX': world.dotX.copy(),
+		'dotY': world.dotY.copy(),
+		'dotColor': world.dotColor.copy(),
+		'dotPlaced': world.dotPlaced.copy(),
+		'dotExpiry': world.dotExpiry.copy(),
+		'eyeX': body.eyeX.copy(),
+		'eyeY': body.eyeY.copy(),
+		'statsDots': np.array(trainer.stats.dots.values),
+		'statsGreen': np.array(trainer.stats.green.values),
+		'statsReward': np.array(trainer.stats.reward.values, dtype=np.float64),
+	}
+	if keys is not None:
+		snap['qKeys'] = keys.copy()
+	if replay is not None:
+		for name, array in replay.toArrays().items():
+			snap[name] = array.copy()
+	return snap
+
+def write(filename, snap):
+# Write to a temporary file first and rename it over the old checkpoint, so a crash
+# mid-write never leaves a broken checkpoint behind
+
+	tmp = filename + '.tmp'
+	with open(tmp, 'wb') as f:
+		np.savez(f, **snap)
+		f.flush()
+		os.fsync(f.fileno())
+	os.replace(tmp, filename)
+
+def restore(filename, trainer):
+# Put a run saved by snapshot back into trainer (and its world, body and agent)
+
+	with np.load(filename, allow_pickle=False) as data:
+		meta = json.loads(str(data['meta']))
+		world = trainer.world
+		body = trainer.body
+		agent = trainer.agent
+		if 'qKeys' in data:
+			agent.q.loadSparse(data['qKeys'], data['q'], data['visits'])
+		else:
+			agent.q.loadArrays(data['q'], data['visits'])
+		agent.epsilon = meta['epsilon']
+		world.setDots(data['dotX'], data['dotY'], data['dotColor'], data['dotPlaced'], data['dotExpiry'], meta['worldTime'])
+		body.setPose(meta['bodyX'], meta['bodyY'], meta['angle'])
+		body.eyeX = data['eyeX'].copy()
+		body.eyeY = data['eyeY'].copy()
+		dotsIndex, greenIndex, rewardIndex = meta['statsIndex']
+		trainer.stats.dots.load(data['statsDots'].tolist(), dotsIndex)
+		trainer.stats.green.load(data['statsGreen'].tolist(), greenIndex)
+		trainer.stats.reward.load(data['statsReward'].tolist(), rewardIndex)
+		if trainer.replay is not None and 'replay' in meta:
+			trainer.replay.loadArrays(data, meta['replay']['index'], meta['replay']['count'])
+			trainer.replay.rng.bit_generator.state = meta['replay']['rngState']
+	trainer.age = meta['age']
+	trainer.score = meta['score']
+	trainer.detected = meta['detected']
+	lastState = meta['lastState']
+	if isinstance(lastState, list):
+		lastState = tuple(lastState)
+	trainer.lastState = lastState
+	trainer.lastAction = meta['lastAction']
+	for rng, (version, state, gauss) in zip([world.genRng, world.relocRng, agent.rng], meta['rngStates']):
+		rng.setstate((version, tuple(state), gauss))
+
+class Checkpointer():
+# Saves a checkpoint every everyIters iterations and/or everySecs seconds
+# The training loop only takes a snapshot, the file is written on a background thread
+# If writing fails the error is kept and raised from the next save or close (the thread keeps
+# taking snapshots off the queue so the training loop never waits on a thread that gave up)
+
+	def __init__(self, filename, everyIters=0, everySecs=0):
+		self.filename = filename
+		self.everyIters = everyIters
+		self.everySecs = everySecs
+		self.lastTime = time.time()
+		self.error = None
+		self.pending = queue.Queue(maxsize=1)
+		self.thread = threading.Thread(target=self.writer, daemon=True)
+		self.thread.start()
+
+	def writer(self):
+		while True:
+			snap = self.pending.get()
+			if snap is None:
+				return
+			try:
+				write(self.filename, snap)
+			except Exception as e:
+				self.error = e
+
+	def check(self):
+	# Raise (once) the error of a failed write
+
+		error = self.error
+		if error is not None:
+			self.error = None
+			raise RuntimeError("Writing checkpoint %s failed: %s" % (self.filename, error)) from error
+
+	def maybeSave(self, trainer):
+		if self.everyIters > 0 and trainer.age % self.everyIters == 0:
+			self.save(trainer)
+		elif self.everySecs > 0 and time.time() - self.lastTime >= self.everySecs:
+			self.save(trainer)
+
+	def save(self, trainer):
+	# Waits only if the previous checkpoint is still being written
+
+		self.check()
+		self.lastTime = time.time()
+		self.pending.put(snapshot(trainer))
+
+	def close(self):
+	# Finish writing any pending checkpoint
+
+		if self.thread.is_alive():
+			self.pending.put(None)
+			self.thread.join()
+		self.check()
@@ -0,0 +1,134 @@
+import multiprocessing
+import numpy as np
+import argparse
+import json
+import os
+import Agent
+import Config
+import Schedule
+import Trainer
+import evaluate
+
+# Compares training schedules (see Schedule) by how quickly they learn. Every schedule trains in
+# the same seeded worlds, and every `every` iterations its greedy policy (no exploration, no bonus,
+# no learning) is scored on a fixed evaluation world. That gives a convergence curve of green
+# ratio against environment steps (one action per iteration). Schedules are ranked by the
+# steps their curve, averaged over the seeds, needs to reach the target green ratio
+
+# Schedule options (Schedule keyword arguments) compared when no --schedules file is given,
+# on top of the config's own schedule
+CANDIDATES = {
+	'global': {},
+	'visits': {'alpha': 'visits', 'alphaScale': 20.0},
+	'decay': {'epsilon': 0.3, 'epsilonMin': 0.01, 'epsilonHalfLife': 5000},
+	'visits+decay': {'alpha': 'visits', 'alphaScale': 20.0, 'epsilon': 0.3, 'epsilonMin': 0.01, 'epsilonHalfLife': 5000},
+	'visits+bonus': {'alpha': 'visits', 'alphaScale': 20.0, 'bonus': 0.5},
+}
+
+def makeSchedule(config, options):
+# The config's schedule with options changed
+
+	values = config.makeSchedule().toDict()
+	values.update(options)
+	return Schedule.Schedule(**values)
+
+def curve(config, options, seed, steps, every, evalSteps, evalSeed):
+# Train with one schedule and return [(steps, greedy green ratio, training green ratio)]
+# config is a Config dict, options the schedule's keyword arguments
+
+	config = Config.Config(config)
+	world = config.makeWorld(seed)
+	body = config.makeBody()
+	agent = config.makeAgent(seed=seed)
+	trainer = Trainer.Trainer(world, body, agent, schedule=makeSchedule(config, options))
+	points = []
+	while trainer.age < steps:
+		trainer.run(min(trainer.age + every, steps), quiet=True)
+		player = Agent.Agent(config.numEyes, seed=evalSeed, epsilon=0.0)
+		player.q = agent.q			# same table, but its own exploration (none) and random stream
+		result = evaluate.score(config.makeWorld(evalSeed), config.makeBody(), player, evalSeed, evalSteps)
+		points.append((trainer.age, result['greenRatio'], trainer.stats.ratio()))
+	return points
+
+def stepsToTarget(ages, ratios, target):
+# First point of a curve at or above target, None if it never gets there
+
+	for age, ratio in zip(ages, ratios):
+		if ratio >= target:
+			return int(age)
+	return None
+
+def compare(schedules, config=None, steps=50000, every=2500, evalSteps=2000, target=0.85, seeds=3, seed=None, numWorkers=None):
+# Convergence curves of every schedule ({name: options}) for seeds seeds (seed, seed + 1, ...),
+# run on numWorkers processes (all CPUs by default)
+
+	if seed is None:
+		seed = int.from_bytes(os.urandom(4), 'little')
+	config = Config.Config(config).toDict()
+	evalSeed = seed + 1000003		# away from the training seeds
+	jobs = [(config, options, seed + k, steps, every, evalSteps, evalSeed) for options in schedules.values() for k in range(seeds)]
+	numWorkers = min(numWorkers or os.cpu_count() or 1, len(jobs))
+	if numWorkers > 1:
+		with multiprocessing.Pool(numWorkers) as pool:
+			curves = pool.starmap(curve, jobs)
+	else:
+		curves = [curve(*job) for job in jobs]
+
+	results = {}
+	for i, (name, options) in enumerate(schedules.items()):
+		runs = np.array(curves[i * seeds:(i + 1) * seeds])		# seeds x points x (age, greedy, train)
+		ages = runs[0, :, 0].astype(np.int64).tolist()
+		greedy = runs[:, :, 1].mean(axis=0)
+		results[name] = {
+			'schedule': makeSchedule(Config.Config(config), options).toDict(),
+			'steps': ages,
+			'greenRatio': greedy.tolist(),
+			'trainGreenRatio': runs[:, :, 2].mean(axis=0).tolist(),
+			'seedGreenRatios': runs[:, :, 1].tolist(),
+			'stepsToTarget': stepsToTarget(ages, greedy, target),
+			'seedStepsToTarget': [stepsToTarget(ages, run[:, 1], target) for run in runs],
+		}
+	ranking = sorted(results, key=lambda name: (results[name]['stepsToTarget'] is None, results[name]['stepsToTarget'] or 0, -results[name]['greenRatio'][-1]))
+	return {
+		'config': config,
+		'steps': steps,
+		'every': every,
+		'evalSteps': evalSteps,
+		'target': target,
+		'seeds': seeds,
+		'seed': seed,
+		'ranking': ranking,
+		'results': results,
+	}
+
+def printReport(report):
+	print("Green ratio of the greedy policy every %d steps (mean of %d seeds), target %.3f" % (report['every'], report['seeds'], report['target']))
+	for name in report['ranking']:
+		r = report['results'][name]
+		reached = "%d steps" % r['stepsToTarget'] if r['stepsToTarget'] is not None else "not reached"
+		print("%-14s %-12s final %.3f  %s" % (name, reached, r['greenRatio'][-1], makeSchedule(Config.Config(report['config']), r['schedule']).describe()))
+		print("%14s %s" % ("", " ".join("%.2f" % v for v in r['greenRatio'])))
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Compare learning rate/exploration schedules by their convergence curves")
+	parser.add_argument("--schedules", help="JSON file of {name: Schedule options} to compare instead of the built in candidates", required=False, default=None)
+	parser.add_argument("--config", help="YAML or JSON file with world/agent options", required=False, default=None)
+	parser.add_argument("-n", "--steps", help="Training steps per run", required=False, type=int, default=50000)
+	parser.add_argument("--every", help="Steps between greedy evaluations", required=False, type=int, default=2500)
+	parser.add_argument("--eval_steps", help="Steps per greedy evaluation", required=False, type=int, default=2000)
+	parser.add_argument("--target", help="Green ratio to reach", required=False, type=float, default=0.85)
+	parser.add_argument("-k", "--seeds", help="Training runs (seeds) per schedule", required=False, type=int, default=3)
+	parser.add_argument("--seed", help="First seed (random if not given)", required=False, type=int, default=None)
+	parser.add_argument("--workers", help="Processes to run on (all CPUs if not given)", required=False, type=int, default=None)
+	parser.add_argument("-o", "--output", help="JSON file the curves are written to", required=False, default="convergence.json")
+	args = vars(parser.parse_args())
+
+	schedules = CANDIDATES
+	if args['schedules']:
+		with open(args['schedules']) as f:
+			schedules = json.load(f)
+	config = Config.load(args['config']).toDict() if args['config'] else None
+	report = compare(schedules, config, max(args['steps'], 1), max(args['every'], 1), max(args['eval_steps'], 1), args['target'], max(args['seeds'], 1), args['seed'], args['workers'])
+	with open(args['output'], 'w') as f:
+		json.dump(report, f, indent=1)
+	printReport(report)
@@ -0,0 +1,98 @@
+import multiprocessing
+import numpy as np
+import argparse
+import json
+import math
+import os
+import Trainer
+import RollingStats
+import Config
+
+# Scores a trained model without drawing or learning: K episodes of a fixed number of steps,
+# each in its own seeded world, spread over a process pool. Results (per episode and the
+# mean with a 95% confidence interval per metric) are written as JSON
+
+METRICS = ['greenRatio', 'dotsPerStep', 'rewardPerStep']
+
+def episode(modelIn, seed, steps, config=None, epsilon=0.0):
+# One headless episode with a greedy (or epsilon-greedy) agent, returns its totals
+# config is a Config dict (world and body options)
+
+	config = Config.Config(config)
+	agent = config.makeAgent(seed=seed)
+	agent.loadQ(modelIn, mmap=True)
+	agent.epsilon = epsilon
+	return score(config.makeWorld(seed), config.makeBody(), agent, seed, steps)
+
+def score(world, body, agent, seed, steps):
+# Totals of steps steps of agent acting without learning, the stats windows cover the whole
+# episode so their sums are the episode totals
+
+	stats = RollingStats.TrainStats(steps, steps)
+	trainer = Trainer.Trainer(world, body, agent, stats=stats, learn=False)
+	trainer.run(steps, quiet=True)
+	return {
+		'seed': seed,
+		'dots': stats.dots.sum,
+		'green': stats.green.sum,
+		'reward': trainer.score,
+		'greenRatio': stats.ratio(),
+		'dotsPerStep': stats.dots.sum / float(steps),
+		'rewardPerStep': trainer.score / steps,
+	}
+
+def summarize(values):
+# Mean, sample standard deviation and a normal-approximation 95% confidence interval
+
+	values = np.asarray(values, dtype=np.float64)
+	mean = float(values.mean())
+	std = float(values.std(ddof=1)) if len(values) > 1 else 0.0
+	half = 1.96 * std / math.sqrt(len(values))
+	return {'mean': mean, 'std': std, 'ci95': [mean - half, mean + half]}
+
+def evaluate(modelIn, episodes=32, steps=5000, seed=None, numWorkers=None, config=None, epsilon=0.0):
+# Run episodes episodes (episode k uses seed + k) on numWorkers processes (all CPUs by default)
+
+	if seed is None:
+		seed = int.from_bytes(os.urandom(4), 'little')
+	numWorkers = min(numWorkers or os.cpu_count() or 1, episodes)
+	jobs = [(modelIn, seed + k, steps, config, epsilon) for k in range(episodes)]
+	if numWorkers > 1:
+		with multiprocessing.Pool(numWorkers) as pool:
+			results = pool.starmap(episode, jobs)
+	else:
+		results = [episode(*job) for job in jobs]
+	return {
+		'model': modelIn,
+		'episodes': episodes,
+		'steps': steps,
+		'config': Config.Config(config).toDict(),
+		'epsilon': epsilon,
+		'seed': seed,
+		'summary': {metric: summarize([r[metric] for r in results]) for metric in METRICS},
+		'results': results,
+	}
+
+def printSummary(report):
+	print("%d episodes x %d steps, seeds %d..%d" % (report['episodes'], report['steps'], report['seed'], report['seed'] + report['episodes'] - 1))
+	for metric in METRICS:
+		s = report['summary'][metric]
+		print("%-14s %.4f  (95%% CI %.4f .. %.4f)" % (metric, s['mean'], s['ci95'][0], s['ci95'][1]))
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Score a trained model over many seeded headless episodes")
+	parser.add_argument("-i", "--input", help="Model to evaluate (binary model or .pkl)", required=False, default="model.qtab")
+	parser.add_argument("-o", "--output", help="JSON file to write the results to", required=False, default="evaluation.json")
+	parser.add_argument("-k", "--episodes", help="Number of episodes", required=False, type=int, default=32)
+	parser.add_argument("-n", "--steps", help="Steps per episode", required=False, type=int, default=5000)
+	parser.add_argument("--seed", help="Seed of the first episode (episode k uses seed + k)", required=False, type=int, default=None)
+	parser.add_argument("--workers", help="Processes to spread the episodes over (default: all CPUs)", required=False, type=int, default=None)
+	parser.add_argument("--config", help="YAML or JSON file with the world/agent options the model was trained with", required=False, default=None)
+	parser.add_argument("--epsilon", help="Exploration rate while evaluating", required=False, type=float, default=0.0)
+	args = vars(parser.parse_args())
+
+	config = Config.load(args['config']).toDict() if args['config'] else None
+	report = evaluate(args['input'], max(args['episodes'], 1), max(args['steps'], 1), args['seed'], args['workers'], config, args['epsilon'])
+	with open(args['output'], 'w') as f:
+		json.dump(report, f, indent=1)
+	printSummary(report)
@@ -0,0 +1,99 @@
+import numpy as np
+import argparse
+import json
+import pickle
+import struct
+
+# Model file layout (all little endian):
+#   magic "EDQL", u16 version, u16 reserved, u32 header length
+#   JSON header (eyes, actions, hyperparameters, state encoding, array shape)
+#   zero padding up to the next multiple of 64 bytes
+#   Q values as float32 (states x actions, C order)
+#   visit counts as uint32 (states x actions)
+#   sparse models ("layout": "sparse" in the header) only have rows for some states,
+#   followed by the state number of every row as int64
+# The arrays are at fixed offsets so they can be mapped straight from the file
+
+MAGIC = b'EDQL'
+VERSION = 1
+PREFIX = struct.Struct('<4sHHI')
+ALIGN = 64
+
+def isModelFile(filename):
+	with open(filename, 'rb') as f:
+		return f.read(4) == MAGIC
+
+def save(filename, q, visits, numEyes, numCodes, actions, alpha, gamma, epsilon, keys=None):
+# keys (the state number of each row) makes it a sparse model
+
+	header = {
+		'numEyes': numEyes,
+		'numCodes': numCodes,
+		'actions': list(actions),
+		'alpha': alpha,
+		'gamma': gamma,
+		'epsilon': epsilon,
+		'encoding': 'base%d, first eye is the most significant digit' % numCodes,
+		'shape': list(q.shape),
+		'layout': 'dense' if keys is None else 'sparse',
+	}
+	header = json.dumps(header).encode('utf-8')
+	start = PREFIX.size + len(header)
+	padding = (-start) % ALIGN
+	with open(filename, 'wb') as f:
+		f.write(PREFIX.pack(MAGIC, VERSION, 0, len(header)))
+		f.write(header)
+		f.write(b'\0' * padding)
+		f.write(np.ascontiguousarray(q, dtype='<f4').tobytes())
+		f.write(np.ascontiguousarray(visits, dtype='<u4').tobytes())
+		if keys is not None:
+			f.write(np.ascontiguousarray(keys, dtype='<i8').tobytes())
+
+def load(filename, mmap=True):
+# Returns (header, q, visits, keys), keys is None unless the model is sparse. With mmap the arrays are read-only views of the file, so
+# every process that loads the same model shares one copy of it in memory
+
+	with open(filename, 'rb') as f:
+		magic, version, _, headerLen = PREFIX.unpack(f.read(PREFIX.size))
+		if magic != MAGIC:
+			raise ValueError("%s is not a model file" % filename)
+		if version != VERSION:
+			raise ValueError("%s has model format version %d, only version %d is supported" % (filename, version, VERSION))
+		header = json.loads(f.read(headerLen).decode('utf-8'))
+	shape = tuple(header['shape'])
+	offset = PREFIX.size + headerLen
+	offset += (-offset) % ALIGN
+	count = shape[0] * shape[1]
+	sparse = header.get('layout', 'dense') == 'sparse'
+	keys = None
+	if mmap:
+		q = np.memmap(filename, dtype='<f4', mode='r', offset=offset, shape=shape)
+		visits = np.memmap(filename, dtype='<u4', mode='r', offset=offset + count * 4, shape=shape)
+		if sparse:
+			keys = np.memmap(filename, dtype='<i8', mode='r', offset=offset + count * 8, shape=(shape[0],))
+	else:
+		with open(filename, 'rb') as f:
+			f.seek(offset)
+			q = np.fromfile(f, dtype='<f4', count=count).reshape(shape)
+			visits = np.fromfile(f, dtype='<u4', count=count).reshape(shape)
+			if sparse:
+				keys = np.fromfile(f, dtype='<i8', count=shape[0])
+	return header, q, visits, keys
+
+def convert(pklIn, modelOut, numEyes=5):
+# Convert a pickled {(state tuple, action): value} model into the binary format
+# Only load pickles you trust, unpickling can run arbitrary code
+
+	import Agent
+	agent = Agent.Agent(numEyes)
+	with open(pklIn, 'rb') as f:
+		agent.q.fromDict(pickle.load(f))
+	agent.saveQ(modelOut)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Convert a pickled model (e.g. model.pkl) into the binary model format")
+	parser.add_argument("input", help="Pickled model to convert")
+	parser.add_argument("output", help="Binary model file to write (e.g. model.qtab)")
+	parser.add_argument("--eyes", help="Number of eyes the model was trained with", required=False, type=int, default=5)
+	args = vars(parser.parse_args())
+	convert(args['input'], args['output'], args['eyes'])
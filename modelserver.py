@@ -0,0 +1,265 @@
+import numpy as np
+import argparse
+import os
+import selectors
+import socket
+import stat
+import struct
+import Agent
+import modelfile
+import seeding
+
+# Serves a trained model to other programs over a Unix socket or localhost TCP
+# Wire protocol (all little endian):
+#   on connect the server sends a hello: magic "EDQS", u16 version, u16 eyes, u16 actions, u16 reserved
+#   a request is a u32 count followed by count observations, one byte per eye holding what the
+#   eye sees (0 nothing, 1 green, 2 red, 3 edge, see World)
+#   every request is answered, in order, by a u32 count and one action byte per observation
+# Clients don't have to wait for a reply before sending the next request (pipelining). Every
+# request that has arrived from any client is answered with one vectorized table lookup, and a
+# client that sends something malformed is disconnected
+
+MAGIC = b'EDQS'
+VERSION = 1
+HELLO = struct.Struct('<4sHHHH')
+COUNT = struct.Struct('<I')
+MAX_BATCH = 1 << 20			# observations per request
+RECV_SIZE = 1 << 18
+SMALL_BATCH = 32			# fewer observations than this are answered without numpy (less overhead)
+
+def parseAddress(address):
+# "host:port" is a TCP address, anything else a Unix socket path
+
+	host, sep, port = address.rpartition(':')
+	if sep and port.isdigit():
+		return (host or '127.0.0.1', int(port))
+	return address
+
+def listen(address):
+	address = parseAddress(address)
+	if isinstance(address, tuple):
+		sock = socket.create_server(address)
+	else:
+		if os.path.exists(address) and stat.S_ISSOCK(os.stat(address).st_mode):
+			os.unlink(address)		# left over from a server that didn't shut down cleanly
+		sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		sock.bind(address)
+		sock.listen()
+	sock.setblocking(False)
+	return sock
+
+def connect(address):
+	address = parseAddress(address)
+	if isinstance(address, tuple):
+		sock = socket.create_connection(address)
+		sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+	else:
+		sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		sock.connect(address)
+	return sock
+
+class Connection():
+# A client's socket with the bytes received but not handled yet and the replies not sent yet
+
+	def __init__(self, sock):
+		self.sock = sock
+		self.received = bytearray()
+		self.unsent = bytearray()
+
+class ModelServer():
+# Loads a model once (memory mapped, so several servers share one copy) and answers requests
+# from any number of clients with a single thread
+
+	def __init__(self, modelIn, address, seed=None, epsilon=0.0):
+		header = modelfile.load(modelIn)[0]
+		self.agent = Agent.Agent(header['numEyes'], seed=seed, epsilon=epsilon)
+		self.agent.loadQ(modelIn, mmap=True)
+		self.numEyes = self.agent.q.numEyes
+		self.numCodes = self.agent.q.numCodes
+		self.codes = bytes(range(self.numCodes))
+		self.rng = seeding.makeNumpyRng(seed, 'explore')
+		self.hello = HELLO.pack(MAGIC, VERSION, self.numEyes, len(self.agent.actions), 0)
+		self.address = address
+		self.listener = listen(address)
+		self.selector = selectors.DefaultSelector()
+		self.selector.register(self.listener, selectors.EVENT_READ, None)
+		self.queries = 0
+
+	def serve(self):
+		while True:
+			self.poll()
+
+	def poll(self, timeout=None):
+	# Wait for sockets to be ready, read everything that arrived and answer all complete requests
+
+		requests = []			# (connection, observations per request, observation bytes)
+		for key, events in self.selector.select(timeout):
+			conn = key.data
+			if conn is None:
+				self.accept()
+				continue
+			if events & selectors.EVENT_WRITE:
+				self.flush(conn)
+				if conn.sock.fileno() < 0:
+					continue		# dropped while sending
+			if events & selectors.EVENT_READ:
+				try:
+					data = conn.sock.recv(RECV_SIZE)
+				except BlockingIOError:
+					continue
+				except ConnectionError:
+					data = b''
+				if not data:
+					self.drop(conn)
+					continue
+				conn.received += data
+				counts, observations = self.parse(conn)
+				if counts is None:
+					self.drop(conn)
+				elif counts:
+					requests.append((conn, counts, observations))
+		if requests:
+			self.answer(requests)
+
+	def accept(self):
+		sock, _ = self.listener.accept()
+		if sock.family != socket.AF_UNIX:
+			sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		sock.setblocking(False)
+		conn = Connection(sock)
+		self.selector.register(sock, selectors.EVENT_READ, conn)
+		conn.unsent += self.hello
+		self.flush(conn)
+
+	def parse(self, conn):
+	# Split the complete requests off the received bytes, returns (observations per request, their
+	# bytes) or (None, None) if they are malformed
+
+		buf = conn.received
+		counts = []
+		parts = []
+		start = 0
+		while len(buf) - start >= COUNT.size:
+			count = COUNT.unpack_from(buf, start)[0]
+			if count > MAX_BATCH:
+				return None, None
+			end = start + COUNT.size + count * self.numEyes
+			if len(buf) < end:
+				break
+			counts.append(count)
+			parts.append(buf[start + COUNT.size:end])
+			start = end
+		if not counts:
+			return counts, None
+		del buf[:start]
+		observations = b''.join(parts)
+		if observations.translate(None, self.codes):		# something left after deleting every valid code
+			return None, None
+		return counts, observations
+
+	def answer(self, requests):
+	# One lookup for every observation of every request, then the replies are handed back in order
+
+		agent = self.agent
+		numEyes = self.numEyes
+		data = b''.join(observations for _, _, observations in requests)
+		count = len(data) // numEyes
+		if count < SMALL_BATCH:
+			actions = bytes(agent.chooseAction(agent.encode(data[i:i + numEyes])) for i in range(0, len(data), numEyes))
+		else:
+			codes = np.frombuffer(data, dtype=np.uint8).reshape(-1, numEyes)
+			states = agent.q.encodeAll(codes.astype(np.int64))
+			actions = agent.chooseActions(states, self.rng).astype(np.uint8).tobytes()
+		self.queries += count
+		start = 0
+		for conn, counts, _ in requests:
+			for count in counts:
+				conn.unsent += COUNT.pack(count)
+				conn.unsent += actions[start:start + count]
+				start += count
+			self.flush(conn)
+
+	def flush(self, conn):
+	# Send as much of the pending replies as the socket takes, the rest when it is writable again
+
+		if conn.unsent:
+			try:
+				sent = conn.sock.send(conn.unsent)
+			except BlockingIOError:
+				sent = 0
+			except ConnectionError:
+				self.drop(conn)
+				return
+			del conn.unsent[:sent]
+		events = selectors.EVENT_READ | (selectors.EVENT_WRITE if conn.unsent else 0)
+		if self.selector.get_key(conn.sock).events != events:
+			self.selector.modify(conn.sock, events, conn)
+
+	def drop(self, conn):
+		self.selector.unregister(conn.sock)
+		conn.sock.close()
+
+	def close(self):
+		for key in list(self.selector.get_map().values()):
+			if key.data is not None:
+				key.data.sock.close()
+		self.selector.close()
+		self.listener.close()
+		address = parseAddress(self.address)
+		if not isinstance(address, tuple) and os.path.exists(address):
+			os.unlink(address)
+
+class Client():
+# Connection to a ModelServer. actions() sends observations (rows of eye codes) and waits for the
+# actions, or send() several requests and receive() their replies in the same order later
+
+	def __init__(self, address):
+		self.sock = connect(address)
+		magic, version, self.numEyes, self.numActions, _ = HELLO.unpack(self.recvExact(HELLO.size))
+		if magic != MAGIC:
+			self.sock.close()
+			raise ValueError("%s is not a model server" % address)
+		if version != VERSION:
+			self.sock.close()
+			raise ValueError("model server speaks protocol version %d, only version %d is supported" % (version, VERSION))
+
+	def send(self, observations):
+		observations = np.asarray(observations, dtype=np.uint8).reshape(-1, self.numEyes)
+		self.sock.sendall(COUNT.pack(len(observations)) + observations.tobytes())
+
+	def receive(self):
+		count = COUNT.unpack(self.recvExact(COUNT.size))[0]
+		return np.frombuffer(self.recvExact(count), dtype=np.uint8)
+
+	def actions(self, observations):
+		self.send(observations)
+		return self.receive()
+
+	def recvExact(self, size):
+		buf = bytearray()
+		while len(buf) < size:
+			data = self.sock.recv(size - len(buf))
+			if not data:
+				raise ConnectionError("model server closed the connection")
+			buf += data
+		return bytes(buf)
+
+	def close(self):
+		self.sock.close()
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Load a model once and answer observation -> action queries over a socket")
+	parser.add_argument("-i", "--input", help="Model file to serve (e.g. model.qtab)", required=False, default="model.qtab")
+	parser.add_argument("-l", "--listen", help="Unix socket path, or host:port for TCP (e.g. 127.0.0.1:5555)", required=False, default="eatdots.sock")
+	parser.add_argument("--seed", help="Seed for breaking ties between equally good actions", required=False, type=int, default=None)
+	parser.add_argument("--epsilon", help="Chance of answering with a random action instead", required=False, type=float, default=0.0)
+	args = vars(parser.parse_args())
+
+	server = ModelServer(args['input'], args['listen'], args['seed'], args['epsilon'])
+	print("Serving %s (%d eyes) on %s" % (args['input'], server.numEyes, args['listen']))
+	try:
+		server.serve()
+	except KeyboardInterrupt:
+		print("Server stopped after %d queries." % server.queries)
+	finally:
+		server.close()
@@ -0,0 +1,127 @@
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import os
+import threading
+import Agent
+import QTable
+import Trainer
+import Config
+
+# Q tables are exchanged through shared memory laid out as:
+#   merged q, merged visits			(states x actions)
+#   worker q, worker visits			(workers x states x actions), one slot per worker
+
+BARRIER_BROKEN = 3		# exit code of workers stopped because another process broke the barrier
+JOIN_SECS = 10
+
+def sharedArray(shm, shape, dtype):
+	return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+def worker(index, seed, iters, syncEvery, names, numWorkers, shape, barrier, config, reportEvery):
+# Train in a world of its own, stopping every syncEvery iterations to hand over its table
+# and pick up the merged one
+
+	config = Config.Config(config)
+	world = config.makeWorld(seed)
+	body = config.makeBody()
+	agent = config.makeAgent(seed=seed)
+	trainer = Trainer.Trainer(world, body, agent, schedule=config.makeSchedule())
+
+	blocks = [shared_memory.SharedMemory(name=name) for name in names]
+	try:
+		mergedQ = sharedArray(blocks[0], shape, np.float64)
+		mergedVisits = sharedArray(blocks[1], shape, np.uint32)
+		slotQ = sharedArray(blocks[2], (numWorkers,) + shape, np.float64)[index]
+		slotVisits = sharedArray(blocks[3], (numWorkers,) + shape, np.uint32)[index]
+
+		while trainer.age < iters:
+			trainer.run(min(trainer.age + syncEvery, iters), quiet=(index != 0), reportEvery=reportEvery)
+			slotQ[:] = agent.q.q
+			slotVisits[:] = agent.q.visits
+			barrier.wait()		# Tables handed over, main process merges them
+			barrier.wait()		# Merged table is ready
+			agent.q.q[:] = mergedQ
+			agent.q.visits[:] = mergedVisits
+	except threading.BrokenBarrierError:
+		raise SystemExit(BARRIER_BROKEN)		# Another worker died, it reports why
+	except BaseException:
+		barrier.abort()		# Don't leave the other processes waiting on a worker that died
+		raise
+	finally:
+		for block in blocks:
+			block.close()
+
+def mergeTables(mergedQ, mergedVisits, slotQ, slotVisits):
+# Visit-weighted average of the workers' tables. Each worker started the round from the merged
+# table, so its weight for an entry is how many times it updated that entry since then
+
+	newVisits = (slotVisits - mergedVisits).astype(np.float64)
+	total = newVisits.sum(axis=0)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		averaged = (newVisits * slotQ).sum(axis=0) / total
+	mergedQ[:] = np.where(total > 0, averaged, mergedQ)
+	mergedVisits += total.astype(np.uint32)
+
+def workerFailure(processes):
+# Message naming the workers that broke the barrier (the rest exit with BARRIER_BROKEN)
+
+	for p in processes:
+		p.join(JOIN_SECS)
+	failed = ["worker %d (exit code %s)" % (i, p.exitcode) for i, p in enumerate(processes) if p.exitcode != BARRIER_BROKEN]
+	return "Parallel training stopped: %s failed" % ", ".join(failed)
+
+def trainParallel(numWorkers, iters, syncEvery, modelOut, seed=None, config=None, reportEvery=5000):
+# Run numWorkers independent training loops (iters iterations each) in separate processes
+# and merge their Q tables every syncEvery iterations. Worker i uses seed + i
+# config is a Config dict, the merged tables are dense so there can't be too many eyes
+# Worker 0 prints a stats line every reportEvery iterations. Raises RuntimeError if a worker dies
+
+	if seed is None:
+		seed = int.from_bytes(os.urandom(4), 'little')
+	agent = Config.Config(config).makeAgent()
+	if isinstance(agent.q, QTable.SparseQTable):
+		raise ValueError("Parallel training needs a dense Q table (at most %d states)" % Agent.DENSE_STATES)
+	shape = agent.q.q.shape
+	size = int(np.prod(shape))
+	blocks = [shared_memory.SharedMemory(create=True, size=size * 8),
+		shared_memory.SharedMemory(create=True, size=size * 4),
+		shared_memory.SharedMemory(create=True, size=numWorkers * size * 8),
+		shared_memory.SharedMemory(create=True, size=numWorkers * size * 4)]
+	processes = []
+	try:
+		mergedQ = sharedArray(blocks[0], shape, np.float64)
+		mergedVisits = sharedArray(blocks[1], shape, np.uint32)
+		slotQ = sharedArray(blocks[2], (numWorkers,) + shape, np.float64)
+		slotVisits = sharedArray(blocks[3], (numWorkers,) + shape, np.uint32)
+		mergedQ[:] = 0
+		mergedVisits[:] = 0
+
+		barrier = multiprocessing.Barrier(numWorkers + 1)
+		names = [block.name for block in blocks]
+		for i in range(numWorkers):
+			p = multiprocessing.Process(target=worker, args=(i, seed + i, iters, syncEvery, names, numWorkers, shape, barrier, config, reportEvery))
+			p.start()
+			processes.append(p)
+
+		rounds = (iters + syncEvery - 1) // syncEvery
+		try:
+			for r in range(rounds):
+				barrier.wait()
+				mergeTables(mergedQ, mergedVisits, slotQ, slotVisits)
+				barrier.wait()
+		except threading.BrokenBarrierError:
+			raise RuntimeError(workerFailure(processes)) from None
+		for p in processes:
+			p.join()
+
+		agent.q.q[:] = mergedQ
+		agent.q.visits[:] = mergedVisits
+		agent.saveQ(modelOut)
+	finally:
+		for p in processes:
+			if p.is_alive():
+				p.terminate()
+		for block in blocks:
+			block.close()
+			block.unlink()
@@ -1,498 +1,323 @@
-import matplotlib
-from matplotlib.patches import Circle
-import Agent
-import matplotlib.pyplot as plt
-import random
-import math
+import Config
+import Schedule
+import Trainer
+import checkpoint
+import seeding
+import Instrument
+import RollingStats
+import trajectory
 import argparse
-import warnings
-
-def create_world():
-# Generates 50 dots to be "randomly" placed on the field
-
-	gc = 0
-	dots = []
-	for i in range(50):
-		x, y = genRandPt(dots)
-		while x == y == -1:
-			x, y = genRandPt(dots)
-		dot, gc = create_dot(x, y, gc)
-		
-		ax.add_artist(dot)
-		dots.append(dot)
-	return dots
-
-def genRandPt(dots):
-# Generates a random point but returns (-1, -1) if the random point is too close
-# to an existing dot
-
-	# 0.015  is radius of dot
-	x = random.uniform(0.015, ax.get_xlim()[1] - 0.015)
-	y = random.uniform(0.015, ax.get_ylim()[1] - 0.015)
-	for dot in dots:
-		dx = abs(dot.center[0] - x)
-		dy = abs(dot.center[1] - y)
-		if dx < dot.radius * 2 and dy < dot.radius * 2:
-			return -1, -1
-	return x, y
-
-def create_dot(x, y, gc):
-# Creates a dot at a specified point with a 60% chance of being green
-
-	if random.random() < 0.6 and gc < 30:
-		color = 'green'
-		gc += 1
-	else:
-		color = 'red'
-	dot = Circle((x, y), 0.015, color=color)
-	return dot, gc
-
-def dotDetected():
-# Finds what objects each eye can see but only returns the closest ones
-# 0 = nothing, 1 = green dot, 2 = red dot, 3 = edge
-
-	dist = [99] * agent.numEyes
-	detected = [0] * agent.numEyes
-	wall = agent.nearEdge()
-	for i,eye in enumerate(agent.eyes):
-		tempDist = distToWall(eye)
-		if tempDist < 99:
-			detected[i] = 3
-			dist[i] = tempDist				
-		for dot in dots:
-			if eyeSeeDot(dot, eye):
-				tempDist = pt2ptDist(dot.center[0], dot.center[1], agent.circle.center[0], agent.circle.center[1], dot.radius, agent.circle.radius)
-				if tempDist < dist[i]:
-					dist[i] = tempDist
-					if dot.get_facecolor()[0] == 0.0:	# green
-						detected[i] = 1
-					elif dot.get_facecolor()[0] == 1.0:	# red
-						detected[i] = 2
-	return detected
-
-def distToWall(eye):
-# Finds distance to edge of field since eyes can see beyond the edges
-
-	if eye[1] < 0:
-		angle = math.asin(min(abs(eye[1] - eye[0]) / agent.viewDist, 1))
-		if angle == 0:
-			dist = agent.viewDist - abs(eye[1])
-		else:
-			dist = agent.viewDist - abs(eye[1]) / math.sin(angle)
-	elif eye[1] > ax.get_xlim()[1]:
-		angle = math.asin(min((eye[1] - eye[0]) / agent.viewDist, 1))
-		if angle == 0:
-			dist = agent.viewDist - (eye[1] - ax.get_xlim()[1])
-		else:
-			dist = agent.viewDist - (eye[1] - ax.get_xlim()[1]) / math.sin(angle)
-	elif eye[3] < 0:
-		angle = math.acos(min(abs(eye[3] - eye[2]) / agent.viewDist, 1))
-		if angle == math.pi / 2:
-			dist = agent.viewDist - abs(eye[3])
-		else:
-			dist = agent.viewDist - abs(eye[3]) / math.cos(angle)
-	elif eye[3] > ax.get_ylim()[1]:
-		angle = math.acos(min((eye[3] - eye[2]) / agent.viewDist, 1))
-		if angle == math.pi / 2:
-			dist = agent.viewDist - (eye[3] - ax.get_ylim()[1])
-		else:
-			dist = agent.viewDist - (eye[3] - ax.get_ylim()[1]) / math.cos(angle)
-	else:
-		dist = 99
-	return dist
-
-def maxMove(eye):
-# Finds maximum move distance possible before agent goes out of bounds
-# Only applies if agent is near edge (i.e. eyes can see beyond edge)
-
-	if eye[1] < 0:
-		angle = math.asin(min(abs(eye[1] - eye[0]) / agent.viewDist, 1))
-		if angle == 0:
-			dist = agent.viewDist - abs(eye[1])
-		else:
-			dist = (abs(eye[1] - eye[0]) - abs(eye[1]) - agent.circle.radius) / math.sin(angle)
-	elif eye[1] > ax.get_xlim()[1]:
-		angle = math.asin(min((eye[1] - eye[0]) / agent.viewDist, 1))
-		if angle == 0:
-			dist = agent.viewDist - (eye[1] - ax.get_xlim()[1])
-		else:
-			dist = ((eye[1] - eye[0]) - (eye[1] - ax.get_xlim()[1]) - agent.circle.radius) / math.sin(angle)
-	elif eye[3] < 0:
-		angle = math.acos(min(abs(eye[3] - eye[2]) / agent.viewDist, 1))
-		if angle == math.pi / 2:
-			dist = agent.viewDist - abs(eye[3])
-		else:
-			dist = (abs(eye[3] - eye[2]) - abs(eye[3]) - agent.circle.radius) / math.cos(angle)
-	elif eye[3] > ax.get_ylim()[1]:
-		angle = math.acos(min((eye[3] - eye[2]) / agent.viewDist, 1))
-		if angle == math.pi / 2:
-			dist = agent.viewDist - (eye[3] - ax.get_ylim()[1])
-		else:
-			dist = ((eye[3] - eye[2]) - (eye[3] - ax.get_ylim()[1]) - agent.circle.radius) / math.cos(angle)
-	else:
-		dist = 99
-	return dist
-	
-def pt2ptDist(x1, y1, x2, y2, radius1, radius2):
-# Distance between agent and dot
-
-	dist = math.sqrt(math.pow(x2-x1, 2) + math.pow(y2-y1, 2))
-	dist = dist - radius1 - radius2
-	return dist
-
-def eyeSeeDot(dot, eye):
-# Determines if an eye can "see" a dot by checking if line segment intersects a circle
-# Finds distance from a point (center of dot) to line segment
-# then checks if distance is less than the radius of the dot
-
-	A = dot.center[0] - eye[0]
-	B = dot.center[1] - eye[2]
-	C = eye[1] - eye[0]
-	D = eye[3] - eye[2]
-	
-	dotprod = A * C + B * D
-	lenSq = C * C + D * D
-	param = dotprod / lenSq
-	
-	if param < 0:
-		xx = eye[0]
-		yy = eye[2]
-	elif param > 1:
-		xx = eye[1]
-		yy = eye[3]
-	else:
-		xx = eye[0] + param * C
-		yy = eye[2] + param * D
-
-	dx = dot.center[0] - xx
-	dy = dot.center[1] - yy
-	
-	dist = math.sqrt(dx * dx + dy * dy)
-	return dist < dot.radius
-	
-
-def dotAbsorbed():
-# Checks if agent (circle) contains the point at the center of a dot
-# Dots are NOT eaten if the two circles simply overlap, it must engulf the center of the dot
-
-	absorbed = []
-	for i, dot in enumerate(dots):
-		if (agent.center[0] - agent.circle.radius < dot.center[0] < agent.center[0] + agent.circle.radius) and (agent.center[1] - agent.circle.radius < dot.center[1] < agent.center[1] + agent.circle.radius):
-			absorbed.append(i)
-	return absorbed
-
-def smoothMove(dist, delay):
-	agent.move(dist / 2)
-	fig.canvas.draw()
-	plt.pause(delay / 2)
-	agent.move(dist / 2)
-
-def smoothTurn(angle, delay):
-	agent.turn(float(angle) / 2)
-	fig.canvas.draw()
-	plt.pause(delay / 2)
-	agent.turn(float(angle) / 2)
-
-def train(delay, iters, modelOut):
-# Learn based on rewards from states and actions
-
-	detected = dotDetected()
+import json
+import os
+import time
+
+# Importing this module only loads the simulation core. Process pools, shared memory, batched
+# fields, experience replay and matplotlib are imported where they are used, so library use,
+# headless runs and pool workers don't pay for them
+
+def makeRenderer(world, body):
+# matplotlib is only loaded when something is actually drawn
+
+	import Renderer
+	return Renderer.Renderer(world, body)
+
+def train(world, body, agent, iters, modelOut=None, renderer=None, delay=0, renderEvery=1, instrument=None, checkpointer=None, resume=False, reportEvery=5000, statsWindow=5000, rewardWindow=1000, record=None, replay=None, quiet=False, schedule=None):
+# Learn based on rewards from states and actions, returns the Trainer
+# With no renderer (headless) nothing is drawn and the loop runs as fast as it can
+
+	trainer = Trainer.Trainer(world, body, agent, instrument, RollingStats.TrainStats(statsWindow, rewardWindow), replay=replay, schedule=schedule)
+	if resume:
+		checkpoint.restore(checkpointer.filename, trainer)
+		print("Resuming from %s at age %d" % (checkpointer.filename, trainer.age))
+	if record:
+		trainer.recorder = trajectory.Recorder(record, world, body)
+	try:
+		trainer.run(iters, renderer, delay, renderEvery, quiet, checkpointer, reportEvery)
+	finally:
+		if checkpointer is not None:
+			checkpointer.close()
+		if trainer.recorder is not None:
+			trainer.recorder.close()
+	if modelOut:
+		agent.saveQ(modelOut)
+	return trainer
+
+def runTraining(config=None, iters=50000, modelOut=None, seed=None, backend='array', headless=True, reportEvery=5000, quiet=False):
+# Entry point for using the trainer from other code: trains an agent in a world made from config
+# (a Config, a dict of its options or None for the defaults) and returns the Trainer, whose agent
+# holds the learned table. The model is saved if modelOut is given
+
+	if not isinstance(config, Config.Config):
+		config = Config.Config(config)
+	world = config.makeWorld(seed)
+	body = config.makeBody()
+	agent = config.makeAgent(backend, seed)
+	renderer = None if headless else makeRenderer(world, body)
+	return train(world, body, agent, iters, modelOut, renderer, reportEvery=reportEvery, quiet=quiet, schedule=config.makeSchedule())
+
+run_training = runTraining
+
+def trainVec(env, agent, iters, modelOut, seed=None, reportEvery=5000, statsWindow=5000, rewardWindow=1000, schedule=None):
+# Same as train but every iteration steps all of env's fields at once and the
+# Q table gets one bulk update from all of them (always headless)
+# The schedule goes by iterations, not by the numEnvs actions each one takes
+
+	exploreRng = seeding.makeNumpyRng(seed, 'explore')
+	detected = env.dotDetected()
 	lastState = None
 	lastAction = None
-	reward = 0.0
-	score = 0					# Overall rewards
-	age = 0						# Age is number of iterations (actions)
-	dotsCollected = [0]*5000			# Only track last 5000 iterations
-	greenCollected = [0]*5000
-	avgReward = [0.0] * 1000
-	midEye = int(agent.numEyes/2)
-
-	# Train for specific number of iterations
+	age = 0						# Age is number of iterations (each one is env.numEnvs actions)
+	stats = RollingStats.TrainStats(statsWindow, rewardWindow)
+	if schedule is None:
+		schedule = Schedule.Schedule(epsilon=agent.epsilon)
+	schedule.check(agent)
+
 	while age < iters:
-		state = tuple(detected)				# State is tuple of what every eye sees
-		action = agent.chooseAction(state)
-		reward = 0
-		agent.alpha = 1000.0 / (1000 + age)
-		if action == 0:					# Move straight forward
-			wallDist = distToWall(agent.eyes[midEye])
-			moveDist = maxMove(agent.eyes[midEye])
-			if  moveDist >= 0.025:			# Check if close to edge
-				agent.move(0.025)
-				reward += 0.5			# Increase reward
-			elif moveDist > 0:			# Don't move beyond edge, lower reward for getting too close
-				agent.move(moveDist)
-				reward += 0.5 * (1 - (0.025 - wallDist))
-			else:
-				reward -= 1.0				
-		elif action == 1:				# Turn 15 deg CCW then forward
-			agent.turn(15)
-			wallDist = distToWall(agent.eyes[midEye])
-			moveDist = maxMove(agent.eyes[midEye])
-			if  moveDist >= 0.025:
-				agent.move(0.025)
-			elif moveDist > 0:
-				agent.move(moveDist)
-			else:
-				reward -= 1.0
-		elif action == 2:				# Turn 15 deg CW then forward
-			agent.turn(-15)
-			wallDist = distToWall(agent.eyes[midEye])
-			moveDist = maxMove(agent.eyes[midEye])
-			if  moveDist >= 0.025:
-				agent.move(0.025)
-			elif moveDist > 0:
-				agent.move(moveDist)
-			else:
-				reward -= 1.0
-		elif action == 3:				# Turn 30 deg CCW then forward a little
-			agent.turn(30)
-			wallDist = distToWall(agent.eyes[midEye])
-			moveDist = maxMove(agent.eyes[midEye])
-			if  moveDist >= 0.01:
-				agent.move(0.01)
-			elif moveDist > 0:
-				agent.move(moveDist)
-			else:
-				reward -= 1.0
-		elif action == 4:				# Turn 30 deg CW then forward a little
-			agent.turn(-30)
-			wallDist = distToWall(agent.eyes[midEye])
-			moveDist = maxMove(agent.eyes[midEye])
-			if  moveDist >= 0.01:
-				agent.move(0.01)
-			elif moveDist > 0:
-				agent.move(moveDist)
-			else:
-				reward -= 1.0
-	
-		absorbed = dotAbsorbed()
-		dotsCollected[age%5000] = 0
-		greenCollected[age%5000] = 0
-		for dot in absorbed:
-			if (dots[dot].get_facecolor()[0] == 1.0):
-				reward += -6.0			# Penalized for eating red
-			else:
-				reward += 5.0			# Rewarded for eating green
-				greenCollected[age%5000] += 1
-			x, y = genRandPt(dots)			# Relocate absorbed dot
-			while x == y == -1:
-				x, y = genRandPt(dots)
-
-			dots[dot].center = (x, y)
-			dotAges[dot] = 0
-			dotsCollected[age%5000] += 1
-		
-		detected = dotDetected()
-
-		# Change color of eyes depending on what they see
-		for i in range(agent.numEyes):
-			if detected[i] == 0:				# nothing
-				agent.eyesPlot[i].set_color('black')
-			elif detected[i] == 1:				# green dot
-				agent.eyesPlot[i].set_color('green')
-			elif detected[i] == 2:				# red dot
-				agent.eyesPlot[i].set_color('red')
-			elif detected[i] == 3:				# edge
-				agent.eyesPlot[i].set_color('yellow')
-
-		fig.canvas.draw()
-		plt.pause(delay)
-	
+		schedule.apply(agent, age)
+		state = agent.q.encodeAll(detected)
+		action = agent.chooseActions(state, exploreRng)
+		reward, eaten, greenEaten = env.step(action, age)
+		detected = env.dotDetected()
+		env.ageDots(age)
+
 		# Learn based on last state/action, reward received, and current state
 		if lastState is not None:
-			agent.learn(lastState, lastAction, reward, state)
+			agent.learnBatch(lastState, lastAction, reward, state)
 		lastState = state
 		lastAction = action
 
-		# Relocate dots that have been sitting in place for too long
-		for i in range(len(dotAges)):
-			if dotAges[i] > 2500 and age % 100 == 0 and random.random() < 0.05:
-				x, y = genRandPt(dots)
-				while x == y == -1:
-					x, y = genRandPt(dots)
-
-				dots[i].center = (x, y)
-				dotAges[i] = 0
-			else:
-				dotAges[i] += 1
-
-		score += reward
-		avgReward[age%1000] = reward
+		stats.record(int(eaten.sum()), int(greenEaten.sum()), float(reward.mean()))
 		age += 1
-		dcSum = sum(dotsCollected)
-		gcSum = sum(greenCollected)
-		if dcSum > 0:
-			fuzzScore = gcSum * 1.0 / dcSum
-		else:
-			fuzzScore = 0.0
-		plt.title("age=%d  ratio=%.3f  score=%.2f" % (age, fuzzScore, sum(avgReward) * 1.0 / len(avgReward)))
+		if age % reportEvery == 0:
+			print(stats.report(age))
 
 	agent.saveQ(modelOut)
 
-def play(delay, modelIn):
+def play(world, body, agent, renderer, delay, modelIn, fps=30, record=None, instrument=None):
 # No training or learning
+# The simulation and the window run on separate clocks: an action is taken every delay
+# seconds (back to back with a delay of 0) and the latest state is drawn fps times a second,
+# so drawing never holds the agent back
 
-	detected = dotDetected()
-	age = 0							# Age is number of iterations (actions)
-	dotsCollected = 0
-	greenCollected = 0
-	midEye = int(agent.numEyes/2)
-	
 	try:
-		agent.loadQ(modelIn)				# Load existing "model" (Q table)
+		agent.loadQ(modelIn, mmap=True)			# Load existing "model" (Q table)
 	except:
 		print("Can't open model. Filename: %s" % modelIn)
 		return
 	agent.epsilon = 0.00					# Set random exploration to only 5%
 
-	while True:
-		state = tuple(detected)				# State is a tuple of what every eye sees
-		action = agent.chooseAction(state)
-		if action == 0:					# Move straight forward
-			wallDist = distToWall(agent.eyes[midEye])
-			moveDist = maxMove(agent.eyes[midEye])
-			if  moveDist >= 0.025:			# Check if at edge
-				smoothMove(0.025, delay)
-			elif moveDist > 0:
-				smoothMove(moveDist, delay)
-		elif action == 1:				# Turn 15 deg CCW then move forward
-			#agent.turn(15)
-			smoothTurn(15, delay)
-			wallDist = distToWall(agent.eyes[midEye])
-			moveDist = maxMove(agent.eyes[agent.numEyes/2])
-			if  moveDist >= 0.025:
-				smoothMove(0.025, delay)
-			elif moveDist > 0:
-				smoothMove(moveDist, delay)
-		elif action == 2:				# Turn 15 deg CW then move forward
-			#agent.turn(-15)
-			smoothTurn(-15, delay)
-			wallDist = distToWall(agent.eyes[midEye])
-			moveDist = maxMove(agent.eyes[midEye])
-			if  moveDist >= 0.025:
-				smoothMove(0.025, delay)
-			elif moveDist > 0:
-				smoothMove(moveDist, delay)
-		elif action == 3:				# Turn 30 deg CCW then forward a little
-			#agent.turn(30)
-			smoothTurn(30, delay)
-			wallDist = distToWall(agent.eyes[midEye])
-			moveDist = maxMove(agent.eyes[midEye])
-			if  moveDist >= 0.01:
-				agent.move(0.01)
-			elif moveDist > 0:
-				agent.move(moveDist)
-		elif action == 4:				# Turn 30 deg CW then forward a little
-			#agent.turn(-30)
-			smoothTurn(-30, delay)
-			wallDist = distToWall(agent.eyes[midEye])
-			moveDist = maxMove(agent.eyes[midEye])
-			if  moveDist >= 0.01:
-				agent.move(0.01)
-			elif moveDist > 0:
-				agent.move(moveDist)
-	
-		absorbed = dotAbsorbed()
-
-		# "generate" new dot by moving absorbed dot (instead of deleting a creating a new one)
-		for dot in absorbed:
-			if (dots[dot].get_facecolor()[0] == 0.0):
-				greenCollected += 1
-			x, y = genRandPt(dots)
-			while x == y == -1:
-				x, y = genRandPt(dots)
-
-			dots[dot].center = (x, y)
-			dotAges[dot] = 0
-			dotsCollected += 1
-		
-		detected = dotDetected()
-	
-		# Change color of eyes depending on what they see
-		for i in range(agent.numEyes):
-			if detected[i] == 0:				# nothing
-				agent.eyesPlot[i].set_color('black')
-			elif detected[i] == 1:				# green dot
-				agent.eyesPlot[i].set_color('green')
-			elif detected[i] == 2:				# red dot
-				agent.eyesPlot[i].set_color('red')
-			elif detected[i] == 3:				# edge
-				agent.eyesPlot[i].set_color('yellow')
-
-		fig.canvas.draw()
-		plt.pause(delay / 2)
-
-		# Relocate dots that have been sitting in place for too long
-		for i in range(len(dotAges)):
-			if dotAges[i] > 2500 and age % 100 == 0 and random.random() < 0.05:
-				x, y = genRandPt(dots)
-				while x == y == -1:
-					x, y = genRandPt(dots)
-
-				dots[i].center = (x, y)
-				dotAges[i] = 0
-			else:
-				dotAges[i] += 1
-
-		age += 1
-		if dotsCollected > 0:
-			fuzzScore = float(greenCollected) / dotsCollected
-		else:
-			fuzzScore = 0.0
-		plt.title("ratio=%.3f" % (fuzzScore))
+	recorder = trajectory.Recorder(record, world, body) if record else None
+	trainer = Trainer.Trainer(world, body, agent, instrument, learn=False, recorder=recorder)
+	instrument = trainer.instrument
+	clock = time.perf_counter
+	frameTime = 1.0 / fps
+	nextStep = nextFrame = clock()
+	try:
+		while True:
+			if clock() >= nextStep:
+				trainer.step()
+				instrument.tick(trainer.age)
+				# Don't try to catch up on steps missed while the window was busy
+				nextStep = max(nextStep + delay, clock() - frameTime)
+
+			if clock() >= nextFrame:
+				instrument.begin()
+				renderer.draw(0, trainer.detected, trainer.status())
+				instrument.mark('render')
+				nextFrame = max(nextFrame + frameTime, clock())
+
+			wait = min(nextStep, nextFrame) - clock()
+			if wait > 0:
+				renderer.wait(wait)
+	finally:
+		if recorder is not None:
+			recorder.close()
+
+def rejectOptions(args, names, path):
+# Exit with a message if any of the options (argument names) is set, path can't use them
+
+	used = ["--" + name for name in names if args[name]]
+	if used:
+		print("%s can't be combined with %s" % (path, ", ".join(used)))
+		raise SystemExit(1)
 
 if __name__ == "__main__":
 	print("Parsing Args")
 	parser = argparse.ArgumentParser()
-	parser.add_argument("-m", "--mode", help="Mode is either 'train' to train a model or 'play' to load a trained model", required=False, default="train")
-	parser.add_argument("-s", "--speed", help="Control how fast the animation is between 1 (slowest) and 5 (fastest)", required=False, type=int, default=3)
+	parser.add_argument("-m", "--mode", help="Mode is either 'train' to train a model, 'play' to load a trained model, 'evaluate' to score one over many headless episodes or 'offline' to train from --replay_from logs", required=False, default="train")
+	parser.add_argument("-s", "--speed", help="Control how fast the animation is between 1 (slowest) and 5 (fastest), 6 plays as fast as possible", required=False, type=int, default=3)
+	parser.add_argument("--fps", help="Frames per second drawn in play mode (independent of --speed)", required=False, type=float, default=30)
 	parser.add_argument("-n", "--num_iters", help="Number of iterations to train before saving a model", required=False, type=int, default=50000)
-	parser.add_argument("-i", "--input", help="Specify a filename/path to an existing model", required=False, default="model.pkl")
-	parser.add_argument("-o", "--output", help="Specify an output filename/path for the model being trained", required=False, default="model.pkl")
+	parser.add_argument("-i", "--input", help="Specify a filename/path to an existing model (binary model or .pkl)", required=False, default="model.qtab")
+	parser.add_argument("-o", "--output", help="Specify an output filename/path for the model being trained (a .pkl name saves the old pickle format)", required=False, default="model.qtab")
+	parser.add_argument("--headless", help="Train without opening a window or drawing anything (much faster)", required=False, action="store_true")
+	parser.add_argument("--render_every", help="Only draw every N training iterations", required=False, type=int, default=1)
+	parser.add_argument("--q_backend", help="Q table storage: 'array' (numpy array, sparse if there are too many eyes for a full one), 'sparse' or 'dict'", required=False, choices=["array", "sparse", "dict"], default="array")
+	parser.add_argument("--checkpoint", help="File to write training checkpoints to (and resume from)", required=False, default="checkpoint.npz")
+	parser.add_argument("--checkpoint_every", help="Write a checkpoint every N iterations (0 = off)", required=False, type=int, default=0)
+	parser.add_argument("--checkpoint_secs", help="Write a checkpoint every T seconds (0 = off)", required=False, type=float, default=0)
+	parser.add_argument("--resume", help="Continue the training run saved in the checkpoint file", required=False, action="store_true")
+	parser.add_argument("--seed", help="Seed for reproducible runs (world, dot relocation and exploration each get their own stream)", required=False, type=int, default=None)
+	parser.add_argument("--instrument", help="Record time spent in each phase of the train/play loop to this .csv or .jsonl file", required=False, default=None)
+	parser.add_argument("--instrument_every", help="Iterations between rows written to the --instrument file", required=False, type=int, default=1000)
+	parser.add_argument("--profile", help="Run under cProfile and save the stats to this file", required=False, default=None)
+	parser.add_argument("--report_every", help="Iterations between stats lines printed when headless", required=False, type=int, default=5000)
+	parser.add_argument("--stats_window", help="Iterations the green ratio is measured over", required=False, type=int, default=5000)
+	parser.add_argument("--reward_window", help="Iterations the reward mean/variance are measured over", required=False, type=int, default=1000)
+	parser.add_argument("--workers", help="Train in N processes, each with its own world, and merge their Q tables periodically (headless)", required=False, type=int, default=1)
+	parser.add_argument("--sync_every", help="Iterations between Q table merges when using --workers", required=False, type=int, default=1000)
+	parser.add_argument("--envs", help="Train in N fields stepping in lockstep that share one Q table (headless, each iteration is N actions)", required=False, type=int, default=1)
+	parser.add_argument("--record", help="Write every step of train/play to this trajectory log (see trajectory.py)", required=False, default=None)
+	parser.add_argument("--replay", help="Keep the last N transitions and replay minibatches of them while training (array backend, 0 = off), in offline mode the buffer size (0 = every transition of the logs)", required=False, type=int, default=0)
+	parser.add_argument("--replay_batch", help="Transitions per replayed minibatch", required=False, type=int, default=32)
+	parser.add_argument("--replay_every", help="Steps between replayed minibatches", required=False, type=int, default=1)
+	parser.add_argument("--replay_from", help="Trajectory logs offline mode learns from", required=False, nargs="+", default=[])
+	parser.add_argument("--replay_updates", help="Minibatch updates in offline mode", required=False, type=int, default=100000)
+	parser.add_argument("--config", help="YAML (needs PyYAML) or JSON file with world/agent options, the options below override it", required=False, default=None)
+	parser.add_argument("--field_size", help="Side length of the square field (default 1.25)", required=False, type=float, default=None)
+	parser.add_argument("--dots", help="Number of dots (default 50)", required=False, type=int, default=None)
+	parser.add_argument("--max_green", help="Most dots that start out green (default 30)", required=False, type=int, default=None)
+	parser.add_argument("--green_chance", help="Chance of a dot being green (default 0.6)", required=False, type=float, default=None)
+	parser.add_argument("--dot_radius", help="Dot radius (default 0.015)", required=False, type=float, default=None)
+	parser.add_argument("--agent_radius", help="Agent radius (default 0.025)", required=False, type=float, default=None)
+	parser.add_argument("--eyes", help="Number of eyes (default 5, more than 10 uses a sparse Q table)", required=False, type=int, default=None)
+	parser.add_argument("--view_dist", help="How far the eyes see (default 0.2)", required=False, type=float, default=None)
+	parser.add_argument("--epsilon", help="Exploration rate while training (default 0.1)", required=False, type=float, default=None)
+	parser.add_argument("--gamma", help="Discount of future rewards (default 0.7)", required=False, type=float, default=None)
+	parser.add_argument("--alpha_schedule", help="Learning rate decay by 'global' age (default) or by each state/action's 'visits'", required=False, choices=list(Schedule.ALPHAS), default=None)
+	parser.add_argument("--alpha_scale", help="alpha = scale / (scale + age or visits) (default 1000)", required=False, type=float, default=None)
+	parser.add_argument("--epsilon_min", help="Exploration rate epsilon decays towards (default 0)", required=False, type=float, default=None)
+	parser.add_argument("--epsilon_half_life", help="Iterations for epsilon to get halfway to --epsilon_min (default 0 = no decay)", required=False, type=int, default=None)
+	parser.add_argument("--bonus", help="Exploration bonus / sqrt(1 + visits) added to actions when choosing (default 0)", required=False, type=float, default=None)
+	parser.add_argument("--episodes", help="Number of seeded episodes in evaluate mode (spread over --workers processes, all CPUs if not given)", required=False, type=int, default=32)
+	parser.add_argument("--episode_steps", help="Steps per episode in evaluate mode", required=False, type=int, default=5000)
+	parser.add_argument("--eval_out", help="JSON file evaluate mode writes its results to", required=False, default="evaluation.json")
 	args = vars(parser.parse_args())
-	
-	# Ignore matplotlib deprecation warning - stackoverflow says this is the best fix for now
-	warnings.filterwarnings("ignore",".*GUI is implemented.*")
-
-	# Set up "field" in matplotlib
-	fig, ax = plt.subplots(1, 1)
-	ax.set_aspect('equal')
-	plt.ylim([0, 1.25])
-	plt.xlim([0, 1.25])
-	#plt.ion()
-	plt.show(block=False)
-	ax.set_yticklabels([])
-	ax.set_xticklabels([])
-
-	# Generate green/red dots and initialize agent
-	print("Generating world")
-	dots = create_world()
-	dotAges = [0]*len(dots)
-	agent = Agent.Agent(ax)
+
+	seed = args['seed']
+	try:
+		config = Config.load(args['config']) if args['config'] else Config.Config()
+		config.update({'fieldSize': args['field_size'], 'numDots': args['dots'], 'maxGreen': args['max_green'], 'greenChance': args['green_chance'],
+			'dotRadius': args['dot_radius'], 'agentRadius': args['agent_radius'], 'numEyes': args['eyes'], 'viewDist': args['view_dist'],
+			'epsilon': args['epsilon'], 'gamma': args['gamma'], 'alphaSchedule': args['alpha_schedule'], 'alphaScale': args['alpha_scale'],
+			'epsilonMin': args['epsilon_min'], 'epsilonHalfLife': args['epsilon_half_life'], 'bonus': args['bonus']})
+	except ValueError as e:
+		print(e)
+		raise SystemExit(1)
 
 	mode = args['mode']
 	speed = args['speed']
 	iters = args['num_iters']
 	modelIn = args['input']
 	modelOut = args['output']
+	headless = args['headless']
+	renderEvery = max(args['render_every'], 1)
+	reportEvery = max(args['report_every'], 1)
+	numEnvs = args['envs']
+	numWorkers = args['workers']
+
+	if mode == "evaluate":
+		import evaluate
+		report = evaluate.evaluate(modelIn, max(args['episodes'], 1), max(args['episode_steps'], 1), seed, numWorkers if numWorkers > 1 else None, config.toDict())
+		with open(args['eval_out'], 'w') as f:
+			json.dump(report, f, indent=1)
+		evaluate.printSummary(report)
+		raise SystemExit(0)
+
+	if args['q_backend'] == "dict" and (args['replay'] > 0 or mode == "offline"):
+		print("Experience replay needs the array or sparse Q table backend")
+		raise SystemExit(1)
+	if args['q_backend'] == "dict" and config.makeSchedule().needsVisits():
+		print("Per-visit alpha and exploration bonuses need the array or sparse Q table backend")
+		raise SystemExit(1)
+
+	agent = config.makeAgent(args['q_backend'], seed)
+
+	if mode == "offline":
+		import ReplayBuffer
+		total = ReplayBuffer.countTransitions(args['replay_from'])
+		capacity = args['replay'] if args['replay'] > 0 else total
+		if total > capacity:
+			print("Warning: the logs hold %d transitions, --replay %d keeps only the last %d" % (total, capacity, capacity))
+		replay = ReplayBuffer.fromTrajectories(args['replay_from'], max(capacity, 1), seeding.makeNumpyRng(seed, 'replay'), max(args['replay_batch'], 1))
+		print("Learning from %d transitions" % len(replay))
+		ReplayBuffer.trainOffline(agent, replay, args['replay_updates'], reportEvery, config.makeSchedule())
+		agent.saveQ(modelOut)
+		raise SystemExit(0)
+
+	# Only the single world loop below checkpoints, records, replays and is instrumented
+	singleWorldOptions = ['checkpoint_every', 'checkpoint_secs', 'resume', 'record', 'replay', 'instrument', 'profile']
+
+	if numWorkers > 1 and mode == "train":
+		rejectOptions(args, singleWorldOptions, "--workers")
+		if args['q_backend'] != "array":
+			print("--workers only works with the array Q table backend")
+			raise SystemExit(1)
+		import parallel
+		try:
+			parallel.trainParallel(numWorkers, iters, max(args['sync_every'], 1), modelOut, seed, config.toDict(), reportEvery)
+		except KeyboardInterrupt:
+			print("User cancelled training. No model saved.")
+		except (ValueError, RuntimeError) as e:
+			print(e)
+			raise SystemExit(1)
+		raise SystemExit(0)
+
+	if numEnvs > 1 and mode == "train":
+		rejectOptions(args, singleWorldOptions, "--envs")
+		if args['q_backend'] == "dict":
+			print("--envs needs the array or sparse Q table backend")
+			raise SystemExit(1)
+		env = config.makeVecEnv(numEnvs, seed)
+		try:
+			trainVec(env, agent, iters, modelOut, seed, reportEvery, args['stats_window'], args['reward_window'], config.makeSchedule())
+		except KeyboardInterrupt:
+			print("User cancelled training. No model saved.")
+		raise SystemExit(0)
+
+	# Generate green/red dots (modes above make their own worlds or none at all)
+	print("Generating world")
+	world = config.makeWorld(seed)
+	body = config.makeBody()
+
+	if headless and mode == "play":
+		print("Notice: play mode always needs a window, ignoring --headless")
+		headless = False
 
-	# Delay between frames in seconds
-	timeDelays = [0.5, 0.2, 0.1, 0.05, 0.01]
+	renderer = None if headless else makeRenderer(world, body)
+
+	# Seconds per action (train draws a frame per action, play draws at --fps on its own clock)
+	timeDelays = [0.5, 0.2, 0.1, 0.05, 0.01, 0]
 	delay = timeDelays[speed - 1]
 
+	instrument = Instrument.NullInstrument()
+	if args['instrument']:
+		instrument = Instrument.Instrument(args['instrument'], max(args['instrument_every'], 1))
+
 	if mode == "train":
+		replay = None
+		if args['replay'] > 0:
+			import ReplayBuffer
+			replay = ReplayBuffer.ReplayBuffer(args['replay'], seeding.makeNumpyRng(seed, 'replay'), max(args['replay_batch'], 1), max(args['replay_every'], 1))
+		checkpointer = None
+		if args['checkpoint_every'] > 0 or args['checkpoint_secs'] > 0 or args['resume']:
+			checkpointer = checkpoint.Checkpointer(args['checkpoint'], args['checkpoint_every'], args['checkpoint_secs'])
 		try:
-			train(delay, iters, modelOut)
+			Instrument.profile(train, args['profile'], world, body, agent, iters, modelOut, renderer, delay, renderEvery, instrument, checkpointer, args['resume'], reportEvery, args['stats_window'], args['reward_window'], args['record'], replay, False, config.makeSchedule())
 		except KeyboardInterrupt:
-			print("User cancelled training. No model saved.")
+			if checkpointer is not None and os.path.exists(checkpointer.filename):
+				print("User cancelled training. No model saved, continue from the last checkpoint with --resume.")
+			else:
+				print("User cancelled training. No model saved.")
 		#except:
 		#	print("Unexpected error. No model saved.")
 	elif mode == "play":
-		if not modelOut == "model.pkl":
+		if not modelOut == "model.qtab":
 			print("Notice: You don't need to specify an output file as it will not be used in this mode")
 		try:
-			play(delay, modelIn)
+			Instrument.profile(play, args['profile'], world, body, agent, renderer, delay, modelIn, max(args['fps'], 1), args['record'], instrument)
 		except KeyboardInterrupt:
 			print("User ended session.")
 		#except:
 		#	print("Unexpected error. Session ended")
+	instrument.close()
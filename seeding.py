@@ -0,0 +1,21 @@
+import numpy as np
+import random
+import zlib
+
+# Every component that needs randomness gets its own stream derived from one run seed:
+#   'world'		initial dot placement and colors
+#   'relocate'	where eaten/old dots are moved to and which old dots move
+#   'explore'	exploration and tie breaks when choosing actions
+#   'replay'	which stored transitions are replayed
+# so e.g. a change in how often the agent explores doesn't change where dots appear
+# A seed of None gives unseeded (different every run) streams
+
+def makeRng(seed, stream):
+	if seed is None:
+		return random.Random()
+	return random.Random("%d/%s" % (seed, stream))
+
+def makeNumpyRng(seed, stream):
+	if seed is None:
+		return np.random.default_rng()
+	return np.random.default_rng([seed, zlib.crc32(stream.encode('utf-8'))])
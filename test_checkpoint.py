@@ -0,0 +1,65 @@
+import os
+import tempfile
+import threading
+import unittest
+import Agent
+import World
+import Trainer
+import checkpoint
+
+def makeTrainer():
+	world = World.World(seed=1)
+	world.createWorld()
+	body = World.AgentState(world.size)
+	return Trainer.Trainer(world, body, Agent.Agent(body.numEyes, seed=1))
+
+def runWithTimeout(fn, seconds=10):
+# Run fn on a thread, returns (finished, exception raised)
+
+	outcome = {}
+	def target():
+		try:
+			fn()
+		except BaseException as e:
+			outcome['error'] = e
+	thread = threading.Thread(target=target, daemon=True)
+	thread.start()
+	thread.join(seconds)
+	return not thread.is_alive(), outcome.get('error')
+
+class CheckpointerTest(unittest.TestCase):
+
+	def testWriteFailureIsRaisedInsteadOfDeadlocking(self):
+		trainer = makeTrainer()
+		checkpointer = checkpoint.Checkpointer(os.path.join(tempfile.gettempdir(), 'missing-dir-%d' % os.getpid(), 'ck.npz'), 100)
+		finished, error = runWithTimeout(lambda: trainer.run(2000, quiet=True, checkpointer=checkpointer))
+		self.assertTrue(finished, "training deadlocked after a failed checkpoint write")
+		self.assertIsInstance(error, RuntimeError)
+		self.assertLess(trainer.age, 2000)
+		finished, error = runWithTimeout(checkpointer.close)
+		self.assertTrue(finished, "close deadlocked after a failed checkpoint write")
+		self.assertIsNone(error)
+
+	def testCloseRaisesAPendingFailure(self):
+		trainer = makeTrainer()
+		checkpointer = checkpoint.Checkpointer(os.path.join(tempfile.gettempdir(), 'missing-dir-%d' % os.getpid(), 'ck.npz'))
+		checkpointer.save(trainer)
+		finished, error = runWithTimeout(checkpointer.close)
+		self.assertTrue(finished)
+		self.assertIsInstance(error, RuntimeError)
+
+	def testSaveAndRestore(self):
+		trainer = makeTrainer()
+		trainer.run(300, quiet=True)
+		with tempfile.TemporaryDirectory() as tmp:
+			filename = os.path.join(tmp, 'ck.npz')
+			checkpointer = checkpoint.Checkpointer(filename)
+			checkpointer.save(trainer)
+			checkpointer.close()
+			restored = makeTrainer()
+			checkpoint.restore(filename, restored)
+		self.assertEqual(restored.age, trainer.age)
+		self.assertEqual(restored.agent.q.q.tolist(), trainer.agent.q.q.tolist())
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,69 @@
+import math
+import unittest
+import numpy as np
+import World
+import VecEnv
+
+def randomPose(body, rng, size):
+# Anywhere in the field, facing one of the action headings or any other angle
+
+	x = rng.uniform(body.radius, size - body.radius)
+	y = rng.uniform(body.radius, size - body.radius)
+	if rng.random() < 0.5:
+		body.setPose(x, y, rng.integers(World.NUM_HEADINGS) * World.HEADING_STEP * math.pi / 180)
+	else:
+		body.setPose(x, y, rng.uniform(0, 2 * math.pi))
+
+def worldOf(env, e):
+# World holding env's dots of field e
+
+	world = World.World(env.size, dotRadius=env.dotRadius)
+	zeros = np.zeros(env.numDots, dtype=np.int64)
+	world.setDots(env.dotX[e], env.dotY[e], env.dotColor[e], zeros, zeros, env.time)
+	return world
+
+class SensingTest(unittest.TestCase):
+
+	def assertSeesDots(self, detected):
+		codes = set(np.ravel(detected).tolist())
+		self.assertTrue({World.GREEN, World.RED} & codes, "no dot was ever seen, the comparison proves nothing")
+
+	def testDotDetectedMatchesScalar(self):
+		rng = np.random.default_rng(1)
+		for size, numDots in [(1.25, 50), (1.25, 400), (0.6, 100)]:
+			world = World.World(size, seed=2)
+			world.createWorld(numDots, numDots // 2)
+			for numEyes in (2, 5, 9):
+				body = World.AgentState(size, numEyes)
+				seen = []
+				for k in range(120):
+					randomPose(body, rng, size)
+					detected = world.dotDetected(body)
+					self.assertEqual(detected, world.dotDetectedScalar(body), "size %g, %d dots, pose (%r, %r, %r)" % (size, numDots, body.x, body.y, body.angle))
+					seen.append(detected)
+				self.assertSeesDots(seen)
+
+	def testVecEnvDotDetectedMatchesWorld(self):
+		# Small field (every dot checked), default field (dots near the agent packed first) and
+		# a big one with many dots (dots found through the grid cells)
+		rng = np.random.default_rng(3)
+		for size, numDots, numEnvs in [(0.6, 40, 64), (1.25, 50, 64), (5.0, 3000, 4)]:
+			env = VecEnv.VecEnv(numEnvs, seed=4, size=size, numDots=numDots, maxGreen=numDots // 2)
+			body = World.AgentState(size)
+			for rounds in range(3):
+				env.step(rng.integers(len(VecEnv.TURNS), size=env.numEnvs), rounds + 1)
+				for e in range(env.numEnvs):
+					randomPose(body, rng, size)
+					if body.heading is not None:
+						env.x[e], env.y[e], env.heading[e] = body.x, body.y, body.heading
+						env.eyeX[e], env.eyeY[e] = body.eyeX, body.eyeY
+				detected = env.dotDetected()
+				for e in range(env.numEnvs):
+					body.x, body.y = env.x[e], env.y[e]
+					body.setHeading(int(env.heading[e]))
+					body.eyeX, body.eyeY = env.eyeX[e].copy(), env.eyeY[e].copy()
+					self.assertEqual(detected[e].tolist(), worldOf(env, e).dotDetected(body), "size %g, %d dots, field %d" % (size, numDots, e))
+			self.assertSeesDots(detected)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,223 @@
+import numpy as np
+import argparse
+import json
+import struct
+import time
+import zlib
+
+# Trajectory log layout (all little endian):
+#   magic "EDTR", u16 version, u16 reserved, u32 header length
+#   JSON header (field size, eyes, agent pose and every dot at the start of the log)
+#   chunks of records, each a u32 byte count followed by that many zlib compressed bytes
+# Every record is one RECORD row with a tag saying what happened:
+#   STEP	the agent acted: state, action, reward, next state and its pose afterwards
+#   EATEN	dot was eaten and moved to (x, y)
+#   MOVED	dot sat in place for too long and was moved to (x, y)
+# States are the same base-4 numbers the array Q table uses (first eye most significant)
+# Records are kept in a list and written in bulk, so the log only grows by whole chunks
+# and a log cut short by a crash is readable up to its last chunk
+
+MAGIC = b'EDTR'
+VERSION = 1
+PREFIX = struct.Struct('<4sHHI')
+CHUNK = struct.Struct('<I')
+
+STEP = 1
+EATEN = 2
+MOVED = 3
+
+RECORD = np.dtype([
+	('tag', 'u1'),
+	('action', 'u1'),
+	('color', 'u1'),
+	('age', '<u4'),
+	('state', '<u8'),
+	('nextState', '<u8'),
+	('dot', '<u4'),
+	('reward', '<f4'),
+	('x', '<f4'),
+	('y', '<f4'),
+	('angle', '<f4'),
+])
+
+def stateCode(detected):
+	s = 0
+	for code in detected:
+		s = s * 4 + int(code)
+	return s
+
+def stateCodes(states, numEyes):
+# Eye codes (states x eyes) of an array of state numbers
+
+	codes = np.zeros((len(states), numEyes), dtype=np.int64)
+	states = np.asarray(states, dtype=np.uint64)
+	for i in range(numEyes - 1, -1, -1):
+		codes[:, i] = states % 4
+		states = states // 4
+	return codes
+
+class Recorder():
+# Appends records to a trajectory log. Nothing is written until chunkSize records have
+# piled up (or close is called), then they are packed, compressed and written at once
+
+	def __init__(self, filename, world, body, chunkSize=65536, level=1):
+		self.filename = filename
+		self.chunkSize = chunkSize
+		self.level = level
+		self.rows = []
+		header = json.dumps({
+			'size': world.size,
+			'dotRadius': world.dotRadius,
+			'numEyes': body.numEyes,
+			'viewDist': body.viewDist,
+			'radius': body.radius,
+			'x': body.x,
+			'y': body.y,
+			'angle': body.angle,
+			'dotX': world.dotX.tolist(),
+			'dotY': world.dotY.tolist(),
+			'dotColor': world.dotColor.tolist(),
+			'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+		}).encode('utf-8')
+		self.file = open(filename, 'wb')
+		self.file.write(PREFIX.pack(MAGIC, VERSION, 0, len(header)))
+		self.file.write(header)
+
+	def step(self, age, detected, action, reward, nextDetected, body):
+		self.rows.append((STEP, action, 0, age, stateCode(detected), stateCode(nextDetected), 0, reward, body.x, body.y, body.angle))
+		if len(self.rows) >= self.chunkSize:
+			self.flush()
+
+	def dots(self, age, tag, world, dots):
+	# Dots that were just moved (tag EATEN or MOVED), at their new positions
+
+		for i in dots:
+			self.rows.append((tag, 0, world.dotColor[i], age, 0, 0, i, 0.0, world.dotX[i], world.dotY[i], 0.0))
+
+	def flush(self):
+		if not self.rows:
+			return
+		data = zlib.compress(np.array(self.rows, dtype=RECORD).tobytes(), self.level)
+		self.rows = []
+		self.file.write(CHUNK.pack(len(data)))
+		self.file.write(data)
+		self.file.flush()
+
+	def close(self):
+		self.flush()
+		self.file.close()
+
+def openLog(filename):
+	f = open(filename, 'rb')
+	magic, version, _, headerLen = PREFIX.unpack(f.read(PREFIX.size))
+	if magic != MAGIC:
+		f.close()
+		raise ValueError("%s is not a trajectory log" % filename)
+	if version != VERSION:
+		f.close()
+		raise ValueError("%s has trajectory format version %d, only version %d is supported" % (filename, version, VERSION))
+	header = json.loads(f.read(headerLen).decode('utf-8'))
+	return f, header
+
+def readHeader(filename):
+	f, header = openLog(filename)
+	f.close()
+	return header
+
+def chunks(filename):
+# Records of the log one chunk at a time, so logs of any length can be streamed
+
+	f, header = openLog(filename)
+	with f:
+		while True:
+			prefix = f.read(CHUNK.size)
+			if len(prefix) < CHUNK.size:
+				return
+			data = f.read(CHUNK.unpack(prefix)[0])
+			yield np.frombuffer(zlib.decompress(data), dtype=RECORD)
+
+def read(filename):
+# (header, every record) of a log
+
+	parts = list(chunks(filename))
+	records = np.concatenate(parts) if parts else np.zeros(0, dtype=RECORD)
+	return readHeader(filename), records
+
+def score(filename, window=5000):
+# Scores a log from its records alone: totals, green ratio and the reward per step over
+# consecutive windows of steps
+
+	steps = dots = green = 0
+	reward = 0.0
+	windows = []
+	windowReward = 0.0
+	windowSteps = 0
+	for records in chunks(filename):
+		isStep = records['tag'] == STEP
+		eaten = records[records['tag'] == EATEN]
+		steps += int(isStep.sum())
+		dots += len(eaten)
+		green += int((eaten['color'] == 1).sum())		# World.GREEN
+		rewards = records['reward'][isStep].astype(np.float64)
+		reward += float(rewards.sum())
+		while len(rewards) > 0:
+			take = min(window - windowSteps, len(rewards))
+			windowReward += float(rewards[:take].sum())
+			windowSteps += take
+			rewards = rewards[take:]
+			if windowSteps == window:
+				windows.append(windowReward / window)
+				windowReward = 0.0
+				windowSteps = 0
+	return {
+		'steps': steps,
+		'dots': dots,
+		'green': green,
+		'greenRatio': green / float(dots) if dots else 0.0,
+		'reward': reward,
+		'rewardPerStep': reward / steps if steps else 0.0,
+		'windowRewardPerStep': windows,
+	}
+
+def replay(filename, fps=30, every=1):
+# Re-render a log from its records: the dots start where the header says and move as the
+# dot records say, the agent takes the recorded poses and the eyes show the recorded state
+
+	import World
+	import Renderer
+	header = readHeader(filename)
+	world = World.World(header['size'], dotRadius=header['dotRadius'])
+	count = len(header['dotX'])
+	world.setDots(header['dotX'], header['dotY'], header['dotColor'], np.zeros(count), np.zeros(count), 0)
+	body = World.AgentState(header['size'], header['numEyes'], header['viewDist'], header.get('radius', 0.025))
+	body.setPose(header['x'], header['y'], header['angle'])
+	renderer = Renderer.Renderer(world, body)
+	frameTime = 1.0 / fps
+	for records in chunks(filename):
+		codes = stateCodes(records['nextState'], body.numEyes)
+		for k, r in enumerate(records.tolist()):
+			tag, age = r[0], r[3]
+			if tag == STEP:
+				body.setPose(r[8], r[9], r[10])
+				if age % every == 0:
+					renderer.draw(frameTime, codes[k], "age=%d  reward=%.2f" % (age, r[7]))
+			else:
+				world.dotX[r[6]] = r[8]
+				world.dotY[r[6]] = r[9]
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Re-score or re-render a trajectory log without simulating")
+	parser.add_argument("log", help="Trajectory log written with --record")
+	parser.add_argument("--render", help="Show the log in a window instead of scoring it", required=False, action="store_true")
+	parser.add_argument("--fps", help="Frames per second when rendering", required=False, type=float, default=30)
+	parser.add_argument("--every", help="Only draw every N steps when rendering", required=False, type=int, default=1)
+	parser.add_argument("--window", help="Steps per window of the reward curve when scoring", required=False, type=int, default=5000)
+	args = vars(parser.parse_args())
+
+	if args['render']:
+		try:
+			replay(args['log'], max(args['fps'], 1), max(args['every'], 1))
+		except KeyboardInterrupt:
+			print("User ended replay.")
+	else:
+		print(json.dumps(score(args['log'], max(args['window'], 1)), indent=1))